@@ -1,10 +1,32 @@
+# Submodules are imported on first attribute access (PEP 562), so e.g. render_org_name_en or
+# transliterate_arabic_name never pull in torch, pandas or spaCy.
+import importlib
+import config as _config
 from config import *
-from tokenizers import tokenize_en, tokenize_ar
-from vocab import Vocab, build_vocab
-from dataset import TranslationDataset, collate_fn
-from model import Encoder, Decoder, Seq2Seq, greedy_translate
-from translit import ar_normalize, transliterate_token, transliterate_arabic_name
-from org_renderer import render_org_name_en
-from routing import translate_smart, is_likely_name
-from data_loading import load_ar_en_splits
-from io_artifacts import ModelConfig, save_artifacts, load_artifacts
+
+_LAZY = {
+    "tokenizers": ["tokenize_en", "tokenize_ar"],
+    "vocab": ["Vocab", "build_vocab", "build_vocabs"],
+    "dataset": ["TranslationDataset", "collate_fn", "PretokenizedDataset", "BucketBatchSampler", "pretokenize"],
+    "model": ["Encoder", "Decoder", "Seq2Seq", "greedy_translate", "batch_greedy_translate", "beam_translate"],
+    "translit": ["ar_normalize", "transliterate_token", "transliterate_arabic_name"],
+    "org_renderer": ["render_org_name_en"],
+    "parallel": ["render_many", "transliterate_many"],
+    "routing": ["translate_smart", "translate_many", "is_likely_name"],
+    "data_loading": ["load_ar_en_splits"],
+    "io_artifacts": ["ModelConfig", "save_artifacts", "load_artifacts", "warmup"],
+    "cache": ["TranslationCache"],
+}
+_ORIGIN = {name: module for module, names in _LAZY.items() for name in names}
+__all__ = [n for n in vars(_config) if n.isupper()] + [name for names in _LAZY.values() for name in names]
+
+def __getattr__(name):
+    module = _ORIGIN.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -6,10 +6,11 @@ import streamlit as st
 import torch
 
 # Import from your package (adjust if you use package prefix)
-from io_artifacts import load_artifacts
-from routing import translate_smart, is_likely_name
+from io_artifacts import load_artifacts, artifacts_fingerprint
+from routing import translate_smart, translate_many, is_likely_name
 from org_renderer import render_org_name_en, normalize_tokens_ar
 from config import ARTIFACTS_DIR
+import metrics
 
 st.set_page_config(page_title="AR→EN Company Name Translator", layout="wide")
 
@@ -23,18 +24,24 @@ artifacts_dir = st.text_input("Artifacts directory", ARTIFACTS_DIR)
 device_opt = st.radio("Device", ["Auto (CUDA if available)", "CPU"], horizontal=True)
 device = torch.device("cuda" if (device_opt.startswith("Auto") and torch.cuda.is_available()) else "cpu")
 
-@st.cache_resource(show_spinner=True)
-def _load(art_dir: str, device_type: str):
+def _fingerprint(art_dir: str) -> str:
     if not os.path.exists(os.path.join(art_dir, "model.pt")):
         raise FileNotFoundError(
             f"No model.pt in '{art_dir}'. Train once using your training script to create: "
             "model.pt, src_vocab.json, trg_vocab.json, config.json."
         )
-    model, src_vocab, trg_vocab, cfg = load_artifacts(art_dir, torch.device(device_type))
+    return artifacts_fingerprint(art_dir)
+
+# keyed on the resolved path + artifact fingerprint: switching device/path back and forth reuses
+# loaded models, and only retrained artifacts trigger a reload
+@st.cache_resource(show_spinner=True, max_entries=4)
+def _load(art_dir: str, device_type: str, fingerprint: str):
+    model, src_vocab, trg_vocab, cfg = load_artifacts(art_dir, torch.device(device_type), warm=True)
     return model, src_vocab, trg_vocab, cfg
 
 try:
-    model, src_vocab, trg_vocab, cfg = _load(artifacts_dir, device.type)
+    art_dir = os.path.abspath(artifacts_dir)
+    model, src_vocab, trg_vocab, cfg = _load(art_dir, device.type, _fingerprint(art_dir))
     st.success(f"Loaded ✓  (AR vocab: {len(src_vocab)} | EN vocab: {len(trg_vocab)} | device: {device.type})")
     with st.expander("Model config", expanded=False):
         st.json({
@@ -68,7 +75,8 @@ def translate_once(txt: str) -> str:
 
 if run_btn or text:
     try:
-        output = translate_once(text)
+        with metrics.trace() as tr:
+            output = translate_once(text)
         st.markdown("**Output (EN):**")
         st.success(output)
 
@@ -81,6 +89,10 @@ if run_btn or text:
             st.write("Normalized Arabic tokens:", toks_norm)
             if route == "Org renderer":
                 st.write("Renderer preview:", render_org_name_en(text))
+            if tr.stages:
+                st.write("Stage timings (ms):", {k: round(v * 1000, 3) for k, v in tr.stages.items()})
+            if tr.values:
+                st.write("Decode:", tr.values)
     except Exception as e:
         st.error(f"Error: {e}")
 
@@ -102,7 +114,12 @@ def _batch_translate(df: pd.DataFrame, col: str) -> pd.DataFrame:
             return translate_once(str(x))
         except Exception:
             return ""
-    df["Translated_Output_Streamlit"] = df[col].apply(_safe_translate)
+    try:
+        texts = [str(x) for x in df[col]]
+        df["Translated_Output_Streamlit"] = list(translate_many(model, texts, src_vocab, trg_vocab, device))
+    except Exception:
+        # a bad row fails its whole batch; retry row by row so only that row comes back empty
+        df["Translated_Output_Streamlit"] = df[col].apply(_safe_translate)
     return df
 
 if run_batch and uploaded is not None:
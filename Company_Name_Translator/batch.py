@@ -0,0 +1,197 @@
+# Headless bulk translation: python batch.py in.csv out.csv --column Original_Arabic_Name
+import os, sys, json, time, argparse
+from itertools import islice
+import pandas as pd
+import torch
+
+from config import ARTIFACTS_DIR, INFERENCE_BACKEND
+from io_artifacts import load_artifacts
+from routing import translate_many
+from parallel import make_pool
+from cache import TranslationCache
+from org_renderer import load_glossary
+from dedup import NameClusterer, translate_clustered
+
+OUTPUT_COLUMN = "Translated_Output_Batch"
+CLUSTER_COLUMN = "Cluster_ID"
+
+def iter_chunks(path: str, chunksize: int, skip_rows: int = 0):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        # skip parsed records, not physical lines: quoted fields may span several lines
+        for df in pd.read_csv(path, chunksize=chunksize, dtype=str, keep_default_na=False):
+            if skip_rows >= len(df):
+                skip_rows -= len(df); continue
+            if skip_rows:
+                df, skip_rows = df.iloc[skip_rows:].reset_index(drop=True), 0
+            yield df
+    elif ext == ".parquet":
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(path)
+        for rg in range(pf.num_row_groups):
+            n = pf.metadata.row_group(rg).num_rows
+            if skip_rows >= n:
+                skip_rows -= n; continue
+            for rb in pf.iter_batches(batch_size=chunksize, row_groups=[rg]):
+                df = rb.to_pandas()
+                if skip_rows:
+                    df, skip_rows = df.iloc[skip_rows:], max(0, skip_rows - len(df))
+                if len(df):
+                    yield df.reset_index(drop=True)
+    elif ext in (".xlsx", ".xlsm"):
+        from openpyxl import load_workbook
+        wb = load_workbook(path, read_only=True)
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows)
+        for _ in islice(rows, skip_rows):
+            pass
+        while True:
+            block = list(islice(rows, chunksize))
+            if not block:
+                break
+            yield pd.DataFrame(block, columns=header)
+        wb.close()
+    else:
+        raise ValueError(f"Unsupported input type '{ext}' (expected .csv, .xlsx or .parquet)")
+
+# --- Checkpoint: rows consumed + output size, so a crash mid-chunk can be rolled back. With --dedup the
+# clusterer journal (out.csv.dedup) is rolled back the same way and replayed, so cluster ids survive a resume ---
+def _ckpt_path(out_path: str) -> str: return out_path + ".ckpt"
+def _journal_path(out_path: str) -> str: return out_path + ".dedup"
+
+def read_checkpoint(in_path: str, out_path: str, column: str):
+    try:
+        with open(_ckpt_path(out_path), "r", encoding="utf-8") as f:
+            ckpt = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if ckpt.get("input") != os.path.abspath(in_path) or ckpt.get("column") != column:
+        return None
+    return ckpt
+
+def write_checkpoint(in_path: str, out_path: str, column: str, rows_done: int, out_bytes: int,
+                     dedup: dict = None, dedup_bytes: int = 0):
+    tmp = _ckpt_path(out_path) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"input": os.path.abspath(in_path), "column": column, "rows_done": rows_done,
+                   "out_bytes": out_bytes, "dedup": dedup, "dedup_bytes": dedup_bytes}, f)
+    os.replace(tmp, _ckpt_path(out_path))
+
+def run(in_path, out_path, column, model, src_vocab, trg_vocab, device,
+        chunksize=10000, batch_size=64, max_len=50, output_column=OUTPUT_COLUMN, restart=False, executor=None, cache=None, beam_width=1,
+        clusterer=None, cluster_column=CLUSTER_COLUMN):
+    ckpt = None if restart else read_checkpoint(in_path, out_path, column)
+    dedup, journal_path = (clusterer.settings() if clusterer is not None else None), _journal_path(out_path)
+    if ckpt and ckpt.get("dedup") != dedup:
+        print("Checkpoint was written with other --dedup settings; starting over.", file=sys.stderr)
+        ckpt = None
+    if ckpt and (not os.path.exists(out_path) or os.path.getsize(out_path) < ckpt["out_bytes"]):
+        print("Checkpoint does not match the output file; starting over.", file=sys.stderr)
+        ckpt = None
+    if ckpt and dedup and (not os.path.exists(journal_path) or os.path.getsize(journal_path) < ckpt["dedup_bytes"]):
+        print("Checkpoint does not match the dedup journal; starting over.", file=sys.stderr)
+        ckpt = None
+    rows_done = ckpt["rows_done"] if ckpt else 0
+    fresh = ckpt is None
+    if fresh:
+        open(out_path, "w").close()
+        if dedup:
+            open(journal_path, "w").close()
+    else:
+        with open(out_path, "r+b") as f:
+            f.truncate(ckpt["out_bytes"])  # drop any rows written after the last checkpoint
+        if dedup:
+            with open(journal_path, "r+b") as f:
+                f.truncate(ckpt["dedup_bytes"])
+            with open(journal_path, "r", encoding="utf-8") as f:
+                clusterer.read_journal(f)
+        print(f"Resuming after {rows_done} rows.", file=sys.stderr)
+
+    start, done_now, dedup_bytes = time.perf_counter(), 0, 0
+    journal = open(journal_path, "a", encoding="utf-8") if dedup else None
+    with open(out_path, "a", encoding="utf-8", newline="") as out:
+        if fresh:
+            out.write("\ufeff")  # match the Streamlit download (utf-8-sig)
+        for df in iter_chunks(in_path, chunksize, skip_rows=rows_done):
+            if column not in df.columns:
+                raise KeyError(f"Column '{column}' not in file. Found columns: {list(df.columns)}")
+            texts = ["" if x is None else str(x) for x in df[column]]
+            kwargs = dict(max_len=max_len, batch_size=batch_size, executor=executor, cache=cache, beam_width=beam_width)
+            if clusterer is not None:
+                pairs = translate_clustered(model, texts, src_vocab, trg_vocab, device, clusterer, **kwargs)
+                df[output_column] = [p[0] for p in pairs]
+                df[cluster_column] = [p[1] for p in pairs]
+            else:
+                df[output_column] = list(translate_many(model, texts, src_vocab, trg_vocab, device, **kwargs))
+            df.to_csv(out, header=fresh, index=False)
+            fresh = False
+            out.flush(); os.fsync(out.fileno())
+            rows_done += len(df); done_now += len(df)
+            if cache is not None:
+                cache.flush()
+            if journal is not None:
+                clusterer.write_journal(journal)
+                journal.flush(); os.fsync(journal.fileno())
+                dedup_bytes = os.fstat(journal.fileno()).st_size
+            write_checkpoint(in_path, out_path, column, rows_done, os.fstat(out.fileno()).st_size, dedup, dedup_bytes)
+            rate = done_now / max(1e-9, time.perf_counter() - start)
+            hit_rate = f" | cache hit rate {cache.stats()['hit_rate']:.1%}" if cache is not None else ""
+            clusters = f" | {clusterer.stats()['clusters']} clusters" if clusterer is not None else ""
+            print(f"{rows_done} rows | {rate:.1f} rows/s{hit_rate}{clusters}", file=sys.stderr)
+    if journal is not None:
+        journal.close()
+    for path in (_ckpt_path(out_path), journal_path):
+        if os.path.exists(path):
+            os.remove(path)
+    return rows_done
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Translate a CSV/XLSX/Parquet column to a CSV, in resumable chunks.")
+    ap.add_argument("input")
+    ap.add_argument("output", help="output CSV (appended chunk by chunk)")
+    ap.add_argument("--column", default="Original_Arabic_Name")
+    ap.add_argument("--output-column", default=OUTPUT_COLUMN)
+    ap.add_argument("--artifacts", default=ARTIFACTS_DIR)
+    ap.add_argument("--device", choices=["auto", "cpu", "cuda"], default="auto")
+    ap.add_argument("--mode", choices=["fp32", "int8"], default="fp32", help="int8 = dynamic quantized CPU model")
+    ap.add_argument("--script", action="store_true", help="TorchScript the decoder step")
+    ap.add_argument("--shortlist", action="store_true", help="score only shortlisted target tokens (see shortlist.py)")
+    ap.add_argument("--backend", choices=["torch", "onnx"], default=INFERENCE_BACKEND, help="onnx = ONNX Runtime CPU (see onnx_backend.py)")
+    ap.add_argument("--chunksize", type=int, default=10000)
+    ap.add_argument("--batch-size", type=int, default=64)
+    ap.add_argument("--max-len", type=int, default=50)
+    ap.add_argument("--beam-width", type=int, default=1, help="1 = greedy decoding")
+    ap.add_argument("--workers", type=int, default=0, help="processes for routing/rendering (0 = in-process)")
+    ap.add_argument("--cache", default=None, help="SQLite file for a persistent translation cache")
+    ap.add_argument("--glossary", default=None, help="compiled glossary (see glossary.py) for the org renderer")
+    ap.add_argument("--dedup", action="store_true", help="cluster near-duplicate inputs, translate one per cluster")
+    ap.add_argument("--dedup-threshold", type=float, default=None, help="min similarity to join a cluster (default: config)")
+    ap.add_argument("--cluster-column", default=CLUSTER_COLUMN)
+    ap.add_argument("--restart", action="store_true", help="ignore an existing checkpoint and start over")
+    args = ap.parse_args(argv)
+
+    use_cuda = args.device == "cuda" or (args.device == "auto" and torch.cuda.is_available())
+    device = torch.device("cuda" if use_cuda else "cpu")
+    model, src_vocab, trg_vocab, _ = load_artifacts(args.artifacts, device, mode=args.mode, script=args.script,
+                                                  shortlist=args.shortlist, backend=args.backend)
+    if args.glossary:
+        load_glossary(args.glossary)
+    executor = make_pool(args.workers) if args.workers > 0 else None
+    cache = TranslationCache(path=args.cache)
+    clusterer = None
+    if args.dedup:
+        clusterer = NameClusterer() if args.dedup_threshold is None else NameClusterer(threshold=args.dedup_threshold)
+    start = time.perf_counter()
+    try:
+        n = run(args.input, args.output, args.column, model, src_vocab, trg_vocab, device,
+                chunksize=args.chunksize, batch_size=args.batch_size, max_len=args.max_len,
+                output_column=args.output_column, restart=args.restart, executor=executor, cache=cache,
+                beam_width=args.beam_width, clusterer=clusterer, cluster_column=args.cluster_column)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        cache.close()
+    print(f"Done: {n} rows in {time.perf_counter() - start:.1f}s -> {args.output}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
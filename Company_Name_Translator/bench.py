@@ -0,0 +1,283 @@
+# Benchmark suite with JSON results that can be compared between commits:
+#   python bench.py [normalize routing render translit greedy decode load shortlist onnx import] [--json out.json]
+#   python bench.py --json new.json --compare base.json [--threshold 0.10]   (exit 1 on regression)
+# Metrics ending in _us/_ms are lower-is-better, _per_s higher-is-better. Inputs are seeded, so runs
+# on the same machine measure the same work; model benches are skipped when no trained model exists.
+import os, re, sys, json, time, random, platform, argparse, subprocess
+from config import ARTIFACTS_DIR
+from translit import ar_normalize, transliterate_arabic_name, transliterate_token, clear_translit_memo, AR_DIACRITICS, TATWEEL
+from org_renderer import normalize_tokens_ar, render_org_name_en, scan_org_text, translit_simple
+
+GOLDEN_TRANSLIT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "translit_golden.tsv")
+
+NAME_WORDS = ["شركة", "شركه", "مجموعة", "مؤسسة", "مصرف", "بنك", "القابضة", "للتجارة", "للمقاولات", "الخليج",
+              "النيل", "القصر", "الذهبي", "أرض", "إعمار", "الأمل", "آفاق", "الهدى", "ش.م.ع", "ذ.م.م"]
+
+def sample_names(n: int, seed: int = 0):
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(n):
+        words = [rnd.choice(NAME_WORDS) for _ in range(rnd.randint(2, 5))]
+        if rnd.random() < 0.3:  # diacritics / tatweel / stray spaces, as seen in registry dumps
+            words = [w[:1] + rnd.choice(AR_DIACRITICS + TATWEEL) + w[1:] for w in words]
+        out.append(("  " if rnd.random() < 0.2 else " ").join(words))
+    return out
+
+SENTENCE_WORDS = ["رجل", "يقود", "دراجة", "على", "الطريق", "بجانب", "النهر", "السماء", "زرقاء", "اليوم", "هذا",
+                  "كتاب", "جديد", "أنا", "أحب", "البرمجة", "السيارة", "سريعة", "جدا", "كيف", "حالك"]
+
+def sample_sentences(n: int, seed: int = 0):
+    rnd = random.Random(seed)
+    return [" ".join(rnd.choice(SENTENCE_WORDS) for _ in range(rnd.randint(4, 14))) + rnd.choice([".", "؟", ""])
+            for _ in range(n)]
+
+PERSON_WORDS = ["محمد", "أحمد", "عبدالله", "خالد", "السالم", "الراجحي", "فاطمة", "يوسف", "الشمري", "نور",
+                "الدين", "بن", "عبدالرحمن", "القحطاني", "سعد", "الزهراني", "مريم", "إبراهيم", "الطيب", "هشام"]
+
+def sample_person_names(n: int, seed: int = 0):
+    rnd = random.Random(seed)
+    return [" ".join(rnd.choice(PERSON_WORDS) for _ in range(rnd.randint(2, 4))) for _ in range(n)]
+
+def sample_mixed(n: int, seed: int = 0):
+    # routing input as seen in uploads: mostly names, some free text
+    rnd = random.Random(seed)
+    names, sentences = sample_names(n, seed), sample_sentences(n, seed + 1)
+    return [names[i] if rnd.random() < 0.7 else sentences[i] for i in range(n)]
+
+def _legacy_ar_normalize(s: str) -> str:
+    # ar_normalize before the single-pass translate table, kept as the comparison baseline
+    s = s.replace('أ','ا').replace('إ','ا').replace('آ','ا')
+    s = s.replace('ى','ي').replace(TATWEEL, '')
+    s = re.sub(f"[{AR_DIACRITICS}]", "", s)
+    return re.sub(r"\s+", " ", s).strip()
+
+def per_item_us(fn, items, repeat: int = 5, setup=None) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        for x in items:
+            fn(x)
+        best = min(best, time.perf_counter() - start)
+    return best / max(1, len(items)) * 1e6
+
+def bench_normalize(n: int = 20000) -> dict:
+    items = sample_names(n)
+    return {
+        "ar_normalize_legacy_us": per_item_us(_legacy_ar_normalize, items),
+        "ar_normalize_us": per_item_us(ar_normalize, items),
+        "normalize_tokens_ar_us": per_item_us(normalize_tokens_ar, items),
+    }
+
+def bench_routing(n: int = 20000) -> dict:
+    from routing import is_likely_name
+    # cold: the scan memo is cleared before every repeat, so each item pays the full scan once
+    return {"is_likely_name_us": per_item_us(is_likely_name, sample_mixed(n), setup=scan_org_text.cache_clear)}
+
+def bench_render(n: int = 20000) -> dict:
+    return {"render_org_name_en_us": per_item_us(render_org_name_en, sample_names(n), setup=scan_org_text.cache_clear)}
+
+def check_translit_golden(path: str = GOLDEN_TRANSLIT) -> int:
+    # both transliteration styles must reproduce the recorded outputs exactly -> rows checked
+    bad, n = [], 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            tok, scholarly, simple = line.rstrip("\n").split("\t")
+            n += 1
+            got = (transliterate_token(tok), translit_simple(tok))
+            if got != (scholarly, simple):
+                bad.append((tok, (scholarly, simple), got))
+    if bad:
+        raise AssertionError(f"{len(bad)}/{n} golden transliterations differ, e.g. {bad[:3]}")
+    return n
+
+def bench_translit(n: int = 20000) -> dict:
+    check_translit_golden()  # timing a wrong transliteration is pointless
+    # memos are cleared before every repeat; repeats *within* a run are the realistic hit pattern
+    names = sample_person_names(n)
+    tokens = [t for name in names for t in name.split()]
+    return {
+        "transliterate_arabic_name_us": per_item_us(transliterate_arabic_name, names, setup=clear_translit_memo),
+        "translit_simple_us": per_item_us(translit_simple, tokens, setup=clear_translit_memo),
+    }
+
+def _load_model(artifacts: str):
+    import torch
+    from io_artifacts import load_artifacts
+    device = torch.device("cpu")
+    model, src_vocab, trg_vocab, _ = load_artifacts(artifacts, device)
+    return model, src_vocab, trg_vocab, device
+
+def bench_greedy(n: int = 512, batch_sizes=(1, 8, 32, 128), artifacts: str = ARTIFACTS_DIR) -> dict:
+    from model import batch_greedy_translate
+    model, src_vocab, trg_vocab, device = _load_model(artifacts)
+    items = sample_sentences(n)
+    batch_greedy_translate(model, items[:8], src_vocab, trg_vocab, device)  # warm up
+    results = {}
+    for bs in batch_sizes:
+        m = min(n, 64 * bs)  # keep batch size 1 from dominating the run time
+        start = time.perf_counter()
+        for i in range(0, m, bs):
+            batch_greedy_translate(model, items[i:i + bs], src_vocab, trg_vocab, device)
+        results[f"greedy_bs{bs}_sent_per_s"] = m / (time.perf_counter() - start)
+    return results
+
+def bench_decode(n: int = 256, batch_size: int = 32, widths=(1, 4, 8), artifacts: str = ARTIFACTS_DIR) -> dict:
+    # sentences/sec of the model path; needs torch and a trained model in the artifacts folder
+    from routing import decode_batch
+    model, src_vocab, trg_vocab, device = _load_model(artifacts)
+    items = sample_sentences(n)
+    results = {}
+    for k in widths:
+        start = time.perf_counter()
+        for i in range(0, n, batch_size):
+            decode_batch(model, items[i:i + batch_size], src_vocab, trg_vocab, device, beam_width=k)
+        results[f"beam{k}_sent_per_s"] = n / (time.perf_counter() - start)
+    return results
+
+def _greedy_pair(models: dict, n: int, batch_size: int, src_vocab, trg_vocab, device) -> dict:
+    # sentences/sec per model and how often the last model's output matches the first one's
+    from model import batch_greedy_translate
+    items = sample_sentences(n)
+    results, outs = {}, {}
+    for name, model in models.items():
+        batch_greedy_translate(model, items[:8], src_vocab, trg_vocab, device)  # warm up
+        start, outs[name] = time.perf_counter(), []
+        for i in range(0, n, batch_size):
+            outs[name] += batch_greedy_translate(model, items[i:i + batch_size], src_vocab, trg_vocab, device)
+        results[f"{name}_sent_per_s"] = n / (time.perf_counter() - start)
+    names = list(models)
+    results["exact_match_pct"] = 100.0 * sum(a == b for a, b in zip(outs[names[0]], outs[names[-1]])) / n
+    return results
+
+def bench_shortlist(n: int = 256, batch_size: int = 32, artifacts: str = ARTIFACTS_DIR) -> dict:
+    # greedy decoding with the full output layer vs the shortlist built by shortlist.py
+    import torch
+    from io_artifacts import load_artifacts
+    device = torch.device("cpu")
+    full, src_vocab, trg_vocab, _ = load_artifacts(artifacts, device, backend="torch")
+    fast, _, _, _ = load_artifacts(artifacts, device, shortlist=True, backend="torch")
+    return _greedy_pair({"full": full, "shortlist": fast}, n, batch_size, src_vocab, trg_vocab, device)
+
+def bench_onnx(n: int = 256, batch_size: int = 32, artifacts: str = ARTIFACTS_DIR) -> dict:
+    # greedy decoding on eager PyTorch vs the ONNX Runtime graphs exported by onnx_backend.py
+    import torch
+    from io_artifacts import load_artifacts
+    device = torch.device("cpu")
+    eager, src_vocab, trg_vocab, _ = load_artifacts(artifacts, device, backend="torch")
+    ort_model, _, _, _ = load_artifacts(artifacts, device, backend="onnx")
+    return _greedy_pair({"torch": eager, "onnx": ort_model}, n, batch_size, src_vocab, trg_vocab, device)
+
+def bench_load(repeat: int = 5, artifacts: str = ARTIFACTS_DIR) -> dict:
+    # in-process reloads: the weights file is in the page cache after the first one
+    import torch
+    from io_artifacts import load_artifacts, warmup
+    device = torch.device("cpu")
+    load = warm = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        model, src_vocab, trg_vocab, _ = load_artifacts(artifacts, device)
+        loaded = time.perf_counter()
+        warmup(model, src_vocab, trg_vocab, device)
+        load, warm = min(load, loaded - start), min(warm, time.perf_counter() - loaded)
+    return {"load_artifacts_ms": 1000 * load, "warmup_ms": 1000 * warm}
+
+IMPORT_TARGETS = {
+    "renderer": "from org_renderer import render_org_name_en",
+    "translit": "from translit import transliterate_arabic_name",
+    "routing": "from routing import is_likely_name",
+    "package": "import Company_Name_Translator as pkg; pkg.render_org_name_en",
+}
+
+def bench_import(repeat: int = 5) -> dict:
+    # fresh interpreter per run: in-process import time, plus the whole process (startup included)
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([here, os.path.dirname(here)]))
+    results = {}
+    for name, stmt in IMPORT_TARGETS.items():
+        code = f"import time; t = time.perf_counter(); {stmt}; import sys; " \
+               f"print((time.perf_counter() - t) * 1000, 'torch' in sys.modules)"
+        imp = proc = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, cwd=here, check=True)
+            proc = min(proc, time.perf_counter() - start)
+            ms, torch_loaded = out.stdout.split()
+            imp = min(imp, float(ms))
+        if torch_loaded == "True":
+            print(f"warning: importing {name} loads torch", file=sys.stderr)
+        results[f"{name}_import_ms"] = imp
+        results[f"{name}_process_ms"] = 1000 * proc
+    return results
+
+BENCHES = {"normalize": bench_normalize, "routing": bench_routing, "render": bench_render,
+           "translit": bench_translit, "greedy": bench_greedy, "decode": bench_decode, "load": bench_load,
+           "shortlist": bench_shortlist, "onnx": bench_onnx, "import": bench_import}
+MODEL_BENCHES = {"greedy", "decode", "load", "shortlist", "onnx"}
+
+def lower_is_better(metric: str) -> bool:
+    return metric.endswith(("_us", "_ms"))
+
+def compare(results: dict, baseline: dict, threshold: float = 0.10):
+    # -> rows (metric, base, new, relative change where > 0 is worse, regressed?)
+    rows = []
+    for key in sorted(results.keys() & baseline.keys()):
+        base, new = baseline[key], results[key]
+        if not base:
+            continue
+        worse = (new - base) / base if lower_is_better(key) else (base - new) / base
+        rows.append((key, base, new, worse, worse > threshold))
+    return rows
+
+def run_meta() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "machine": platform.machine(),
+            "platform": platform.platform(), "cpus": os.cpu_count(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Run benchmarks, write JSON results, compare against a baseline.")
+    ap.add_argument("benches", nargs="*", help=f"any of {', '.join(BENCHES)} (default: all)")
+    ap.add_argument("--json", default=None, help="write results here")
+    ap.add_argument("--compare", default=None, help="baseline JSON from an earlier run")
+    ap.add_argument("--threshold", type=float, default=0.10, help="allowed relative slowdown per metric")
+    ap.add_argument("--artifacts", default=ARTIFACTS_DIR)
+    args = ap.parse_args(argv)
+    unknown = set(args.benches) - BENCHES.keys()
+    if unknown:
+        ap.error(f"unknown bench(es): {', '.join(sorted(unknown))}")
+
+    results, skipped = {}, {}
+    for name in args.benches or list(BENCHES):
+        kwargs = {"artifacts": args.artifacts} if name in MODEL_BENCHES else {}
+        try:
+            out = BENCHES[name](**kwargs)
+        except (ImportError, OSError) as e:  # no torch / no trained model
+            skipped[name] = str(e)
+            print(f"{name:>10} | skipped: {e}", file=sys.stderr)
+            continue
+        for k, v in out.items():
+            results[f"{name}.{k}"] = v
+            print(f"{name:>10} | {k:<30} {v:10.2f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"meta": run_meta(), "results": results, "skipped": skipped}, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        rows = compare(results, baseline, args.threshold)
+        print(f"\nvs {args.compare} (change: + is worse; threshold {args.threshold:.0%}):")
+        for key, base, new, worse, regressed in rows:
+            print(f"{'REGRESSED' if regressed else 'ok':>10} | {key:<40} {base:10.2f} -> {new:10.2f} ({worse:+.1%})")
+        if any(r[4] for r in rows):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# LRU translation cache keyed on the normalized Arabic text, with an optional SQLite tier on disk.
+import sys, sqlite3, hashlib, threading
+from functools import lru_cache
+from collections import OrderedDict
+from config import CACHE_MAX_ENTRIES, CACHE_MAX_BYTES
+from translit import ar_normalize
+
+def model_fingerprint(model) -> str:
+    # load_artifacts stamps a digest of the artifact files; otherwise hash the weights once
+    fp = getattr(model, "fingerprint", None)
+    if fp is None:
+        h = hashlib.sha1()
+        for name, t in model.state_dict().items():
+            h.update(name.encode("utf-8"))
+            if hasattr(t, "numpy"):
+                h.update(t.detach().cpu().contiguous().numpy().tobytes())
+        fp = model.fingerprint = h.hexdigest()[:16]
+    return fp
+
+@lru_cache(maxsize=None)
+def _tables_fingerprint() -> str:
+    from org_renderer import LEXICAL_MAP, BUSINESS_MAP, ORG_TYPE_TOKENS
+    h = hashlib.sha1(repr((sorted(LEXICAL_MAP.items()), sorted(BUSINESS_MAP.items()),
+                           sorted(ORG_TYPE_TOKENS))).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+def renderer_fingerprint() -> str:
+    from org_renderer import get_glossary
+    g = get_glossary()
+    return _tables_fingerprint() if g is None else f"{_tables_fingerprint()}:{g.current_version()}"
+
+class TranslationCache:
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_BYTES,
+                 path: str = None, commit_every: int = 1000):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._mem = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.disk_hits = 0
+        self._db, self._pending, self._commit_every = None, 0, commit_every
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS translations ("
+                             "route TEXT, fingerprint TEXT, src TEXT, out TEXT, "
+                             "PRIMARY KEY (route, fingerprint, src)) WITHOUT ROWID")
+
+    @staticmethod
+    def key(text: str, route: str, fingerprint: str):
+        return (route, fingerprint, ar_normalize(text))
+
+    def get(self, key):
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return hit[0]
+            if self._db is not None:
+                row = self._db.execute("SELECT out FROM translations WHERE route=? AND fingerprint=? AND src=?",
+                                       key).fetchone()
+                if row is not None:
+                    self.hits += 1; self.disk_hits += 1
+                    self._put_mem(key, row[0])
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key, value: str):
+        with self._lock:
+            self._put_mem(key, value)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?)", (*key, value))
+                self._pending += 1
+                if self._pending >= self._commit_every:
+                    self._db.commit(); self._pending = 0
+
+    def _put_mem(self, key, value):
+        old = self._mem.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        size = sys.getsizeof(key[2]) + sys.getsizeof(value)
+        self._mem[key] = (value, size)
+        self._bytes += size
+        while self._mem and (len(self._mem) > self.max_entries or
+                             (self.max_bytes is not None and self._bytes > self.max_bytes)):
+            _, (_, sz) = self._mem.popitem(last=False)
+            self._bytes -= sz
+
+    def flush(self):
+        with self._lock:
+            if self._db is not None and self._pending:
+                self._db.commit(); self._pending = 0
+
+    def close(self):
+        self.flush()
+        if self._db is not None:
+            self._db.close(); self._db = None
+
+    def __len__(self): return len(self._mem)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"entries": len(self._mem), "bytes": self._bytes, "hits": self.hits, "misses": self.misses,
+                "disk_hits": self.disk_hits, "hit_rate": self.hits / total if total else 0.0}
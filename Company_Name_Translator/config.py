@@ -11,6 +11,61 @@ DROPOUT = 0.5
 LR = 1e-3
 BATCH = 64
 EPOCHS = 10
+MAX_TOKENS = None  # optional cap on padded tokens per batch (bucketing sampler)
+PARALLEL_DECODER = False  # opt-in: teacher-forced decoder in one LSTM call instead of a per-step Python loop
+TEACHER_FORCE_RATIO = 0.5 # per-step loop only
+SCHEDULED_SAMPLING = 1.0 - TEACHER_FORCE_RATIO  # parallel mode: share of decoder inputs replaced by predictions
+USE_BF16 = False          # bfloat16 autocast for the forward pass
+GRAD_ACCUM_STEPS = 1      # micro-batches per optimizer step
+CHECKPOINT_EVERY = 500    # optimizer steps between resumable checkpoints
 
 # Artifacts folder
 ARTIFACTS_DIR = "artifacts_ar_en"
+# Inference backend for load_artifacts: "torch" (eager/TorchScript) or "onnx" (ONNX Runtime CPU, see onnx_backend.py)
+INFERENCE_BACKEND = "torch"
+# Distillation (train.py --distill <teacher artifacts>): a smaller student trained on the teacher's translations
+STUDENT_ARTIFACTS_DIR = "artifacts_ar_en_student"
+STUDENT_EMB = 128
+STUDENT_HID = 256
+STUDENT_LAYERS = 2
+STUDENT_DROPOUT = 0.2
+# Pre-tokenized training data (dataset.pretokenize), memory-mapped on reuse
+DATA_CACHE_DIR = "data_cache_ar_en"
+# Resumable training checkpoints (train.py)
+CHECKPOINT_DIR = "checkpoints_ar_en"
+
+# Translation cache (cache.TranslationCache) bounds
+CACHE_MAX_ENTRIES = 100_000
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Optional compiled glossary (python glossary.py terms.tsv -o glossary.db) used by the org renderer
+GLOSSARY_PATH = None
+
+# Pipeline instrumentation (metrics.py); off by default, server.py --metrics turns it on
+METRICS_ENABLED = False
+
+# Near-duplicate clustering (dedup.py, batch.py --dedup): min estimated char-3-gram Jaccard to share a cluster
+DEDUP_THRESHOLD = 0.8
+DEDUP_NUM_PERM = 32
+DEDUP_BANDS = 8
+DEDUP_MAX_CLUSTERS = 500_000  # indexed representatives; later new names get a cluster of their own, unindexed
+DEDUP_MAX_KEYS = 2_000_000    # remembered exact folded keys; beyond this keys are re-matched through LSH
+
+# Per-token transliteration memo (translit.py), per process
+TRANSLIT_MEMO_SIZE = 65536
+
+# Decoding limits: a sentence stops after ratio * source tokens + extra output tokens (capped by max_len;
+# None = always max_len), or once its output ends in an n-gram (n <= max period) repeated min times (0 = off)
+DECODE_LEN_RATIO = 2.0
+DECODE_LEN_EXTRA = 4
+REPEAT_MIN_REPEATS = 3
+REPEAT_MAX_PERIOD = 3
+# Optional per-request/per-batch decode budget in seconds (server.py --deadline-ms); None = no deadline
+DECODE_DEADLINE_S = None
+
+# Decoder vocabulary shortlist (shortlist.py, load_artifacts(shortlist=True)): per batch, only the top target
+# tokens of each source token under an IBM Model 1 alignment (p >= min prob) plus the most frequent ones are scored
+SHORTLIST_FILE = "shortlist.pt"
+SHORTLIST_PER_SOURCE = 16
+SHORTLIST_FREQUENT = 128
+SHORTLIST_MIN_PROB = 0.01
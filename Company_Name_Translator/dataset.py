@@ -1,31 +1,175 @@
+import os, json, hashlib
+from itertools import islice
 from typing import Tuple, List
+import numpy as np
 import torch
 import torch.nn as nn
-from torch.utils.data import Dataset
+from torch.utils.data import Dataset, Sampler
 from config import PAD_IDX, SOS_IDX, EOS_IDX
 from vocab import Vocab
+from tokenizers import tokenizer_identity
 
 class TranslationDataset(Dataset):
-    def __init__(self, split, src_tokenize, trg_tokenize, src_vocab: Vocab, trg_vocab: Vocab):
+    # the split is encoded once up front (pretokenize, cached in cache_dir when given), not per item
+    def __init__(self, split, src_tokenize, trg_tokenize, src_vocab: Vocab, trg_vocab: Vocab, cache_dir: str = None):
         self.data = split
         self.src_tok = src_tokenize
         self.trg_tok = trg_tokenize
         self.src_vocab = src_vocab
         self.trg_vocab = trg_vocab
+        self.encoded = pretokenize(split, src_tokenize, trg_tokenize, src_vocab, trg_vocab, cache_dir=cache_dir)
     def __len__(self): return len(self.data)
     def _get_item(self, idx):
         rec = self.data[idx]
         return rec["translation"]["ar"], rec["translation"]["en"]
-    def _encode(self, tokens, vocab):
-        return [SOS_IDX] + vocab.lookup_indices(tokens) + [EOS_IDX]
     def __getitem__(self, idx):
-        src_text, trg_text = self._get_item(idx)
-        src_ids = self._encode(self.src_tok(src_text), self.src_vocab)
-        trg_ids = self._encode(self.trg_tok(trg_text), self.trg_vocab)
-        return torch.tensor(src_ids, dtype=torch.long), torch.tensor(trg_ids, dtype=torch.long)
+        return self.encoded[idx]
 
 def collate_fn(batch: List[Tuple[torch.Tensor, torch.Tensor]]):
     src_seqs, trg_seqs = zip(*batch)
     src_padded = nn.utils.rnn.pad_sequence(src_seqs, batch_first=False, padding_value=PAD_IDX)
     trg_padded = nn.utils.rnn.pad_sequence(trg_seqs, batch_first=False, padding_value=PAD_IDX)
     return src_padded, trg_padded
+
+# --- Pre-tokenized corpus: each split encoded once into flat int32 arrays + offsets ---
+def _encode_flat(vocab: Vocab, token_lists):
+    # -> (ids with <sos>/<eos> of every sequence back to back as int32, lengths): the non-PAD cells of
+    # encode_batch's padded grid, read row by row
+    ids, lengths = vocab.encode_batch(token_lists)
+    ids = ids.t()
+    return ids[torch.arange(ids.shape[1]) < lengths.unsqueeze(1)].numpy().astype(np.int32), lengths.numpy()
+
+class PretokenizedDataset(Dataset):
+    def __init__(self, src_ids, src_off, trg_ids, trg_off):
+        self.src_ids, self.src_off = src_ids, src_off
+        self.trg_ids, self.trg_off = trg_ids, trg_off
+    def __len__(self): return len(self.src_off) - 1
+    def __getitem__(self, idx):
+        src = self.src_ids[self.src_off[idx]:self.src_off[idx + 1]]
+        trg = self.trg_ids[self.trg_off[idx]:self.trg_off[idx + 1]]
+        return torch.from_numpy(src.astype(np.int64)), torch.from_numpy(trg.astype(np.int64))
+    @property
+    def lengths(self) -> np.ndarray:
+        # padded cost of an example in a batch is driven by its longer side
+        return np.maximum(np.diff(self.src_off), np.diff(self.trg_off))
+
+    @classmethod
+    def build(cls, split, src_tokenize, trg_tokenize, src_vocab: Vocab, trg_vocab: Vocab, chunk_size: int = 4096):
+        # Vocab.encode_batch per chunk of the split, flattened into the id arrays
+        src_ids, trg_ids, src_len, trg_len = [np.zeros(0, np.int32)], [np.zeros(0, np.int32)], [[0]], [[0]]
+        it = iter(split)
+        while True:
+            chunk = [rec["translation"] for rec in islice(it, chunk_size)]
+            if not chunk:
+                break
+            ids, lengths = _encode_flat(src_vocab, [src_tokenize(pair["ar"]) for pair in chunk])
+            src_ids.append(ids); src_len.append(lengths)
+            ids, lengths = _encode_flat(trg_vocab, [trg_tokenize(pair["en"]) for pair in chunk])
+            trg_ids.append(ids); trg_len.append(lengths)
+        return cls(np.concatenate(src_ids), np.cumsum(np.concatenate(src_len), dtype=np.int64),
+                   np.concatenate(trg_ids), np.cumsum(np.concatenate(trg_len), dtype=np.int64))
+
+    def save(self, path: str, meta: dict = None):
+        # every file is replaced atomically and meta.json goes last: concurrent writers of the same
+        # cache (one per node on a shared filesystem) never leave a torn file behind
+        os.makedirs(path, exist_ok=True)
+        tmp = f".{os.getpid()}.tmp"
+        for name in ("src_ids", "src_off", "trg_ids", "trg_off"):
+            with open(os.path.join(path, f"{name}.npy{tmp}"), "wb") as f:
+                np.save(f, getattr(self, name))
+            os.replace(os.path.join(path, f"{name}.npy{tmp}"), os.path.join(path, f"{name}.npy"))
+        with open(os.path.join(path, f"meta.json{tmp}"), "w", encoding="utf-8") as f:
+            json.dump(meta or {}, f)
+        os.replace(os.path.join(path, f"meta.json{tmp}"), os.path.join(path, "meta.json"))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True):
+        mode = "r" if mmap else None
+        return cls(*(np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode)
+                     for name in ("src_ids", "src_off", "trg_ids", "trg_off")))
+
+def vocab_digest(vocab: Vocab) -> str:
+    return hashlib.sha1("\n".join(vocab.itos).encode("utf-8")).hexdigest()[:16]
+
+def split_digest(split) -> str:
+    # HF datasets carry a content fingerprint; anything else (lists of records) is hashed
+    fingerprint = getattr(split, "_fingerprint", None)
+    if fingerprint:
+        return f"hf:{fingerprint}"
+    h = hashlib.sha1()
+    for rec in split:
+        pair = rec["translation"]
+        h.update(f"{pair['ar']}\t{pair['en']}\n".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+def pretokenize(split, src_tokenize, trg_tokenize, src_vocab: Vocab, trg_vocab: Vocab, cache_dir: str = None,
+                source: dict = None):
+    # reuse a cached encoding only if it was built from the same split, tokenizers and vocabularies.
+    # source: identity of a derived split (what it was computed from) used instead of hashing it; split
+    # may then be a callable that produces it, only called when the cache misses
+    split_id = source if source is not None else {"n": len(split), "digest": split_digest(split)}
+    meta = {"split": split_id,
+            "src_tokenizer": tokenizer_identity(src_tokenize), "trg_tokenizer": tokenizer_identity(trg_tokenize),
+            "src_vocab": vocab_digest(src_vocab), "trg_vocab": vocab_digest(trg_vocab)}
+    if cache_dir:
+        try:
+            with open(os.path.join(cache_dir, "meta.json"), "r", encoding="utf-8") as f:
+                if json.load(f) == meta:
+                    return PretokenizedDataset.load(cache_dir)
+        except (OSError, ValueError):
+            pass
+    if callable(split):
+        split = split()
+    ds = PretokenizedDataset.build(split, src_tokenize, trg_tokenize, src_vocab, trg_vocab)
+    if cache_dir:
+        ds.save(cache_dir, meta)
+        return PretokenizedDataset.load(cache_dir)
+    return ds
+
+class BucketBatchSampler(Sampler):
+    # shuffle, sort by length inside large pools, then cut batches: similar lengths share a batch,
+    # batch order is still random. With max_tokens, a batch is capped at batch_len * n_examples tokens.
+    # With num_replicas > 1 every rank builds the same batch list and takes an equal, disjoint share.
+    def __init__(self, lengths, batch_size: int, max_tokens: int = None, shuffle: bool = True,
+                 pool_factor: int = 100, seed: int = 0, num_replicas: int = 1, rank: int = 0):
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+        self.shuffle = shuffle
+        self.pool_size = batch_size * pool_factor
+        self.seed = seed
+        self.num_replicas, self.rank = num_replicas, rank
+        self.epoch, self.start = 0, 0
+        self._cached = (None, None)
+    def set_epoch(self, epoch: int, start: int = 0):
+        # start > 0 skips batches already consumed (resuming mid-epoch)
+        self.epoch, self.start = epoch, start
+    def _batches(self):
+        if self._cached[0] == self.epoch:
+            return self._cached[1]
+        rng = np.random.default_rng(self.seed + self.epoch)
+        order = rng.permutation(len(self.lengths)) if self.shuffle else np.arange(len(self.lengths))
+        batches = []
+        for start in range(0, len(order), self.pool_size):
+            pool = order[start:start + self.pool_size]
+            pool = pool[np.argsort(self.lengths[pool], kind="stable")]
+            batch, longest = [], 0
+            for idx in pool.tolist():
+                longest_next = max(longest, int(self.lengths[idx]))
+                too_many = len(batch) >= self.batch_size or \
+                    (self.max_tokens is not None and batch and longest_next * (len(batch) + 1) > self.max_tokens)
+                if too_many:
+                    batches.append(batch)
+                    batch, longest_next = [], int(self.lengths[idx])
+                batch.append(idx); longest = longest_next
+            if batch:
+                batches.append(batch)
+        if self.shuffle:
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+        if self.num_replicas > 1:
+            # equal step counts on every rank keep DDP's collective calls in lockstep
+            batches = batches[:len(batches) - len(batches) % self.num_replicas][self.rank::self.num_replicas]
+        self._cached = (self.epoch, batches)
+        return batches
+    def __iter__(self): return iter(self._batches()[self.start:])
+    def __len__(self): return max(0, len(self._batches()) - self.start)
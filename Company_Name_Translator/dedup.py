@@ -0,0 +1,156 @@
+# Near-duplicate clustering of inputs so each variant family is translated once and rendered the same:
+# "شركة"/"شركه", "ش.م.ع"/"ش م ع", reordered or extra tokens. Exact matches on a folded key are free;
+# the rest go through MinHash over character n-grams of the distinctive tokens (org types and
+# business words such as شركة / للتجارة / والمقاولات are left out, so shared boilerplate cannot
+# merge two names) with LSH banding, and each LSH candidate is checked by exact Jaccard before a
+# merge. Clustering is greedy and streaming: a text joins the most similar existing representative
+# at or above the threshold, otherwise it becomes the representative of a new cluster (no transitive
+# chaining). Memory is bounded by max_clusters / max_keys, and the state can be journaled so a
+# resumed batch run assigns the same ids.
+import json, zlib, hashlib
+import numpy as np
+from translit import ar_normalize
+from org_renderer import ORG_KEYS, BUSINESS_MAP, ORG_TYPE_TOKENS, drop_al, drop_ll
+from routing import translate_many
+from config import DEDUP_THRESHOLD, DEDUP_NUM_PERM, DEDUP_BANDS, DEDUP_MAX_CLUSTERS, DEDUP_MAX_KEYS
+
+_PRIME = (1 << 31) - 1
+_FOLD_TABLE = str.maketrans({"ة": "ه", ".": " ", "،": " ", ",": " ", "-": " ", "_": " "})
+
+def dedup_key(text: str) -> str:
+    # stronger than ar_normalize: ta marbuta folded to ha, punctuation split off, token order ignored
+    return " ".join(sorted(ar_normalize(str(text)).translate(_FOLD_TABLE).split()))
+
+def _boilerplate() -> frozenset:
+    # renderer vocabulary, folded like dedup_key, with its و / ال / لل / ل prefixed forms ("والمقاولات")
+    vocab = ORG_KEYS | ORG_TYPE_TOKENS | set(BUSINESS_MAP)
+    bases = {drop_ll(drop_al(tok)) for k in vocab for tok in dedup_key(k).split()}
+    forms = {p + b for b in bases for p in ("", "ال", "لل", "ل")}
+    return frozenset(forms | {"و" + f for f in forms})
+
+_BOILERPLATE = _boilerplate()
+
+def distinctive_key(key: str) -> str:
+    # a dedup_key without the boilerplate tokens; the full key when nothing else is left
+    return " ".join(tok for tok in key.split() if tok not in _BOILERPLATE) or key
+
+class NameClusterer:
+    def __init__(self, threshold: float = DEDUP_THRESHOLD, num_perm: int = DEDUP_NUM_PERM,
+                 bands: int = DEDUP_BANDS, ngram: int = 3, seed: int = 1,
+                 max_clusters: int = DEDUP_MAX_CLUSTERS, max_keys: int = DEDUP_MAX_KEYS):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.threshold, self.ngram, self.seed = threshold, ngram, seed
+        self.bands, self.rows = bands, num_perm // bands
+        self.max_clusters, self.max_keys = max_clusters, max_keys
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, (num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, (num_perm, 1), dtype=np.uint64)
+        self._by_key = {}    # folded key -> cluster id
+        self._buckets = {}   # (band, band bytes) -> [cluster id]
+        self._sigs = {}      # cluster id -> representative's signature
+        self.reps = {}       # cluster id -> representative text
+        self.translations = {}  # cluster id -> translation of the representative
+        self.inputs = 0
+        self._transient = set()  # clusters past max_clusters: translated for the current call only
+        self._new_keys, self._new_clusters = [], []  # not journaled yet
+
+    def settings(self) -> dict:
+        # everything that decides assignments; a journal only replays under the same settings
+        return {"threshold": self.threshold, "num_perm": self.bands * self.rows, "bands": self.bands,
+                "ngram": self.ngram, "seed": self.seed, "max_clusters": self.max_clusters, "max_keys": self.max_keys,
+                "shingles": "distinctive"}
+
+    def shingles(self, key: str) -> set:
+        n, out = self.ngram, set()
+        for tok in key.split():
+            t = f"#{tok}#"
+            out.update(t[i:i + n] for i in range(max(1, len(t) - n + 1)))
+        return out
+
+    def signature(self, key: str) -> np.ndarray:
+        sh = self.shingles(key)
+        h = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in sh), dtype=np.uint64, count=len(sh)) % _PRIME
+        return ((self._a * h + self._b) % _PRIME).min(axis=1).astype(np.uint32)
+
+    def _bands(self, sig: np.ndarray):
+        return [(i, sig[i * self.rows:(i + 1) * self.rows].tobytes()) for i in range(self.bands)]
+
+    def _add_cluster(self, cid: str, text: str, sig):
+        self.reps[cid] = text
+        if sig is not None:
+            self._sigs[cid] = sig
+            for band in self._bands(sig):
+                self._buckets.setdefault(band, []).append(cid)
+
+    def assign(self, text: str) -> str:
+        # -> cluster id (a digest of the representative's folded key)
+        self.inputs += 1
+        key = dedup_key(text)
+        cid = self._by_key.get(key)
+        if cid is not None:
+            return cid
+        core = distinctive_key(key)
+        sig = self.signature(core) if key else None
+        if sig is not None:
+            best_sim, seen, sh = self.threshold, set(), self.shingles(core)
+            for band in self._bands(sig):
+                for other in self._buckets.get(band, ()):
+                    if other in seen:
+                        continue
+                    seen.add(other)
+                    # the MinHash estimate only nominates; the exact Jaccard against the representative decides
+                    rep = self.shingles(distinctive_key(dedup_key(self.reps[other])))
+                    sim = len(sh & rep) / len(sh | rep)
+                    if sim >= best_sim:
+                        cid, best_sim = other, sim
+        if cid is None:
+            cid = hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest()
+            if len(self.reps) - len(self._transient) >= self.max_clusters:
+                self.reps[cid] = text  # full: not indexed, not remembered past this call
+                self._transient.add(cid)
+                return cid
+            self._add_cluster(cid, text, sig)
+            self._new_clusters.append(cid)
+        if len(self._by_key) < self.max_keys:
+            self._by_key[key] = cid
+            self._new_keys.append((key, cid))
+        return cid
+
+    def forget_transient(self):
+        for cid in self._transient:
+            self.reps.pop(cid, None); self.translations.pop(cid, None)
+        self._transient.clear()
+
+    def write_journal(self, f):
+        # appends the clusters (with translations) and keys added since the last call as one JSON line
+        clusters = [[cid, self.reps[cid], self.translations.get(cid),
+                     self._sigs[cid].tolist() if cid in self._sigs else None] for cid in self._new_clusters]
+        f.write(json.dumps({"inputs": self.inputs, "clusters": clusters, "keys": self._new_keys},
+                           ensure_ascii=False) + "\n")
+        self._new_keys, self._new_clusters = [], []
+
+    def read_journal(self, f):
+        # replays write_journal lines (written with the same settings) into an empty clusterer
+        for line in f:
+            entry = json.loads(line)
+            for cid, text, translation, sig in entry["clusters"]:
+                self._add_cluster(cid, text, None if sig is None else np.asarray(sig, dtype=np.uint32))
+                if translation is not None:
+                    self.translations[cid] = translation
+            self._by_key.update(entry["keys"])
+            self.inputs = entry["inputs"]
+
+    def stats(self) -> dict:
+        return {"inputs": self.inputs, "clusters": len(self.reps), "distinct_keys": len(self._by_key)}
+
+def translate_clustered(model, texts, src_vocab, trg_vocab, device, clusterer: NameClusterer, **kwargs):
+    # -> [(translation, cluster id)] in input order; only representatives not translated before are
+    # sent through translate_many (same routing as translate_smart), the rest are fanned out
+    ids = [clusterer.assign(t) for t in texts]
+    new = [cid for cid in dict.fromkeys(ids) if cid not in clusterer.translations]
+    outs = translate_many(model, [clusterer.reps[cid] for cid in new], src_vocab, trg_vocab, device, **kwargs)
+    clusterer.translations.update(zip(new, outs))
+    pairs = [(clusterer.translations[cid], cid) for cid in ids]
+    clusterer.forget_transient()
+    return pairs
@@ -0,0 +1,118 @@
+# External glossaries: TSV/CSV compiled to a read-only SQLite file, opened lazily and shared
+# between processes through the OS page cache (nothing is loaded into the Python heap up front).
+#   python glossary.py client.tsv other.csv -o glossary.db
+import os, csv, sys, time, sqlite3, hashlib, argparse
+from functools import lru_cache
+from translit import ar_normalize
+
+SCHEMA_VERSION = "1"
+KINDS = {"lexical", "business", "org"}
+
+def _read_rows(path: str):
+    delim = "," if path.lower().endswith(".csv") else "\t"
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.reader(f, delimiter=delim):
+            if len(row) < 2 or not row[0].strip() or row[0].startswith("#"):
+                continue
+            if row[0].strip().lower() in ("arabic", "ar", "source"):
+                continue  # header
+            kind = row[2].strip().lower() if len(row) > 2 and row[2].strip() else "lexical"
+            if kind not in KINDS:
+                raise ValueError(f"{path}: unknown kind '{kind}' for '{row[0]}' (expected one of {sorted(KINDS)})")
+            yield ar_normalize(row[0]), row[1].strip(), kind
+
+def compile_glossary(src_paths, out_path: str, version: str = None) -> dict:
+    h, entries, max_words = hashlib.sha1(), {}, 1
+    for path in src_paths:
+        with open(path, "rb") as f:
+            h.update(f.read())
+        for key, en, kind in _read_rows(path):
+            entries[key] = (en, kind)  # later files override earlier ones
+            max_words = max(max_words, key.count(" ") + 1)
+    meta = {"schema": SCHEMA_VERSION, "version": version or h.hexdigest()[:16],
+            "entries": str(len(entries)), "max_words": str(max_words)}
+    tmp = out_path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    conn.execute("CREATE TABLE entries (key TEXT PRIMARY KEY, en TEXT NOT NULL, kind TEXT NOT NULL) WITHOUT ROWID")
+    conn.execute("CREATE TABLE meta (k TEXT PRIMARY KEY, v TEXT) WITHOUT ROWID")
+    conn.executemany("INSERT INTO entries VALUES (?, ?, ?)", ((k, en, kind) for k, (en, kind) in sorted(entries.items())))
+    conn.executemany("INSERT INTO meta VALUES (?, ?)", meta.items())
+    conn.commit()
+    conn.close()
+    os.replace(tmp, out_path)  # atomic: readers never see a half-written glossary
+    return meta
+
+class Glossary:
+    def __init__(self, path: str, check_interval: float = 2.0, memo_size: int = 65536):
+        self.path = path
+        self.check_interval = check_interval
+        self.memo_size = memo_size
+        self.version, self.max_words = None, 1
+        self._conn, self._pid, self._mtime, self._next_check = None, None, None, 0.0
+        self._lookup = None
+
+    def _open(self):
+        if self._conn is not None:
+            self._conn.close()
+        self._mtime = os.stat(self.path).st_mtime_ns
+        self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        self._pid = os.getpid()
+        meta = dict(self._conn.execute("SELECT k, v FROM meta"))
+        if meta.get("schema") != SCHEMA_VERSION:
+            raise ValueError(f"{self.path}: glossary schema {meta.get('schema')} != {SCHEMA_VERSION}; recompile it")
+        self.version, self.max_words = meta["version"], int(meta["max_words"])
+        self._lookup = lru_cache(maxsize=self.memo_size)(self._query)
+
+    def _ensure(self):
+        # reopen after fork (sqlite handles must not cross processes) and when the file is replaced
+        now = time.monotonic()
+        if self._conn is None or self._pid != os.getpid():
+            self._open()
+        elif now >= self._next_check:
+            if os.stat(self.path).st_mtime_ns != self._mtime:
+                self._open()
+        self._next_check = now + self.check_interval
+
+    def _query(self, key: str):
+        return self._conn.execute("SELECT kind, en FROM entries WHERE key=?", (key,)).fetchone()
+
+    def current_version(self) -> str:
+        self._ensure()
+        return self.version
+
+    def keys(self, kind: str) -> list:
+        # every key of one kind (org keys feed the renderer's routing index)
+        self._ensure()
+        return [k for (k,) in self._conn.execute("SELECT key FROM entries WHERE kind=?", (kind,))]
+
+    def lookup(self, key: str):
+        # -> (kind, en) or None
+        self._ensure()
+        return self._lookup(key)
+
+    def lookup_phrase(self, toks, i: int):
+        # longest multi-word entry starting at toks[i] -> (n_tokens, kind, en) or None
+        self._ensure()
+        for n in range(min(self.max_words, len(toks) - i), 1, -1):
+            hit = self._lookup(" ".join(toks[i:i + n]))
+            if hit is not None:
+                return (n,) + tuple(hit)
+        return None
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close(); self._conn = None
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Compile TSV/CSV glossaries (arabic, english[, kind]) to SQLite.")
+    ap.add_argument("sources", nargs="+")
+    ap.add_argument("-o", "--output", required=True)
+    ap.add_argument("--version", default=None, help="version label (default: hash of the sources)")
+    args = ap.parse_args(argv)
+    meta = compile_glossary(args.sources, args.output, version=args.version)
+    print(f"{meta['entries']} entries (version {meta['version']}) -> {args.output}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
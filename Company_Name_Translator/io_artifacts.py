@@ -1,20 +1,75 @@
-import os, json
+import os, sys, json, time, struct, hashlib, argparse, warnings
 from dataclasses import dataclass, asdict
-from collections import Counter
 import torch
+import torch.nn as nn
 from vocab import Vocab
-from model import Encoder, Decoder, Seq2Seq
-from config import PAD_IDX, SOS_IDX, EOS_IDX, UNK_IDX
+from model import Encoder, Decoder, Seq2Seq, batch_greedy_translate
+from config import PAD_IDX, SOS_IDX, EOS_IDX, UNK_IDX, SHORTLIST_FILE, INFERENCE_BACKEND
 
 # --- Vocab (de)serialization ---
 def vocab_to_json(vocab: Vocab) -> dict:
-    return {"itos": vocab.itos}
+    return {"itos": list(vocab.itos)}
 
 def vocab_from_json(obj: dict) -> Vocab:
-    v = Vocab(counter=Counter(), max_size=None, min_freq=1)
-    v.itos = obj["itos"]
-    v.stoi = {tok: i for i, tok in enumerate(v.itos)}
-    return v
+    return Vocab.from_itos(obj["itos"])
+
+# Packed vocabs: one file with a small header (token and byte count per vocab) followed by each
+# vocab's tokens as one NUL-separated utf-8 blob; loading is one read, one decode and a C-level split.
+VOCAB_BLOB = "vocabs.bin"
+_VOCAB_MAGIC = b"S2SVOC1\0"
+
+def vocabs_to_bytes(*vocabs: Vocab) -> bytes:
+    blobs = []
+    for v in vocabs:
+        if any("\0" in t for t in v.itos):
+            raise ValueError("vocab tokens must not contain NUL")
+        blobs.append("\0".join(v.itos).encode("utf-8"))
+    header = struct.pack(f"<I{2 * len(vocabs)}I", len(vocabs),
+                         *(x for v, blob in zip(vocabs, blobs) for x in (len(v.itos), len(blob))))
+    return _VOCAB_MAGIC + header + b"".join(blobs)
+
+def vocabs_from_bytes(buf: bytes):
+    if buf[:len(_VOCAB_MAGIC)] != _VOCAB_MAGIC:
+        raise ValueError("not a packed vocab file")
+    off = len(_VOCAB_MAGIC)
+    (count,) = struct.unpack_from("<I", buf, off)
+    sizes = struct.unpack_from(f"<{2 * count}I", buf, off + 4)
+    off += 4 + 8 * count
+    vocabs = []
+    for n, nbytes in zip(sizes[::2], sizes[1::2]):
+        itos = buf[off:off + nbytes].decode("utf-8").split("\0") if n else []
+        if len(itos) != n:
+            raise ValueError(f"packed vocab holds {len(itos)} tokens, header says {n}")
+        vocabs.append(Vocab.from_itos(itos))
+        off += nbytes
+    return vocabs
+
+def save_packed_vocabs(path: str, src_vocab: Vocab, trg_vocab: Vocab):
+    tmp = os.path.join(path, VOCAB_BLOB + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(vocabs_to_bytes(src_vocab, trg_vocab))
+    os.replace(tmp, os.path.join(path, VOCAB_BLOB))
+
+def _blob_current(path: str) -> bool:
+    # the packed file counts only if it is not older than the JSON pair it was packed from
+    blob = os.path.join(path, VOCAB_BLOB)
+    if not os.path.exists(blob):
+        return False
+    mtime = os.stat(blob).st_mtime_ns
+    jsons = [os.path.join(path, name) for name in ("src_vocab.json", "trg_vocab.json")]
+    return all(os.stat(f).st_mtime_ns <= mtime for f in jsons if os.path.exists(f))
+
+def load_vocabs(path: str):
+    # packed file when current (written by save_artifacts / `python io_artifacts.py pack`), else the JSON pair
+    blob = os.path.join(path, VOCAB_BLOB)
+    if _blob_current(path):
+        with open(blob, "rb") as f:
+            return tuple(vocabs_from_bytes(f.read()))
+    with open(os.path.join(path, "src_vocab.json"), "r", encoding="utf-8") as f:
+        src_vocab = vocab_from_json(json.load(f))
+    with open(os.path.join(path, "trg_vocab.json"), "r", encoding="utf-8") as f:
+        trg_vocab = vocab_from_json(json.load(f))
+    return src_vocab, trg_vocab
 
 @dataclass
 class ModelConfig:
@@ -32,6 +87,7 @@ def save_artifacts(path: str, model: Seq2Seq, src_vocab: Vocab, trg_vocab: Vocab
         json.dump(vocab_to_json(src_vocab), f, ensure_ascii=False)
     with open(os.path.join(path, "trg_vocab.json"), "w", encoding="utf-8") as f:
         json.dump(vocab_to_json(trg_vocab), f, ensure_ascii=False)
+    save_packed_vocabs(path, src_vocab, trg_vocab)
     meta = asdict(cfg)
     meta.update({
         "pad_idx": PAD_IDX, "sos_idx": SOS_IDX, "eos_idx": EOS_IDX, "unk_idx": UNK_IDX,
@@ -40,7 +96,73 @@ def save_artifacts(path: str, model: Seq2Seq, src_vocab: Vocab, trg_vocab: Vocab
     with open(os.path.join(path, "config.json"), "w", encoding="utf-8") as f:
         json.dump(meta, f, ensure_ascii=False, indent=2)
 
-def load_artifacts(path: str, device: torch.device):
+def artifacts_fingerprint(path: str) -> str:
+    # content of the config, size+mtime of vocabs (the packed file too, when it is used) and weights
+    # (cheap to compute on every load)
+    h = hashlib.sha1()
+    with open(os.path.join(path, "config.json"), "rb") as f:
+        h.update(f.read())
+    names = ("src_vocab.json", "trg_vocab.json", "model.pt") + ((VOCAB_BLOB,) if _blob_current(path) else ())
+    for name in names:
+        st = os.stat(os.path.join(path, name))
+        h.update(f"{name}:{st.st_size}:{st.st_mtime_ns}".encode("ascii"))
+    return h.hexdigest()[:16]
+
+# --- CPU inference: dynamic INT8 quantization + TorchScript decode step ---
+QUANTIZED_WEIGHTS = "model_int8.pt"
+
+def quantize_model(model: Seq2Seq) -> Seq2Seq:
+    # weights of every LSTM/Linear go to int8; activations are quantized on the fly (CPU only)
+    return torch.ao.quantization.quantize_dynamic(model.cpu().eval(), {nn.LSTM, nn.Linear}, dtype=torch.qint8)
+
+def script_decoder(model: Seq2Seq) -> Seq2Seq:
+    # the decoder step runs once per output token, so that is where interpreter overhead adds up
+    try:
+        model.decoder = torch.jit.script(model.decoder)
+    except Exception as e:
+        warnings.warn(f"TorchScript unavailable for the decoder ({e}); using eager mode")
+    return model
+
+def save_quantized(path: str, model: Seq2Seq):
+    # records which fp32 artifacts it was quantized from, so a retrained model.pt is never paired with it
+    torch.save({"source": artifacts_fingerprint(path), "state_dict": model.state_dict()},
+               os.path.join(path, QUANTIZED_WEIGHTS))
+
+def load_quantized(path: str, source: str):
+    # saved int8 state dict, or None when missing or quantized from other fp32 artifacts
+    qpath = os.path.join(path, QUANTIZED_WEIGHTS)
+    if not os.path.exists(qpath):
+        return None
+    # packed params are ScriptObjects: no mmap, and not loadable with weights_only (our own file)
+    try:
+        saved = torch.load(qpath, map_location="cpu", weights_only=False)
+    except TypeError:
+        saved = torch.load(qpath, map_location="cpu")
+    if not isinstance(saved, dict) or saved.get("source") != source:
+        warnings.warn(f"{qpath} does not match model.pt (rerun quantize.py); quantizing model.pt on load")
+        return None
+    return saved["state_dict"]
+
+def load_state(file: str):
+    # mmap: the checkpoint stays in the page cache and tensors are paged in on first touch
+    # (shared across worker processes); older torch without mmap/weights_only reads it whole
+    try:
+        return torch.load(file, map_location="cpu", mmap=True, weights_only=True)
+    except TypeError:
+        return torch.load(file, map_location="cpu")
+
+def build_model(cfg: ModelConfig, src_size: int, trg_size: int) -> Seq2Seq:
+    encoder = Encoder(src_size, cfg.encoder_embedding_size, cfg.hidden_size, cfg.num_layers, cfg.enc_dropout)
+    decoder = Decoder(trg_size, cfg.decoder_embedding_size, cfg.hidden_size, trg_size, cfg.num_layers, cfg.dec_dropout)
+    return Seq2Seq(encoder, decoder, trg_vocab_size=trg_size)
+
+def warmup(model: Seq2Seq, src_vocab: Vocab, trg_vocab: Vocab, device: torch.device, max_len: int = 8):
+    # one dummy decode: pages in the weights and pays kernel/allocator setup before the first request
+    with torch.inference_mode():
+        batch_greedy_translate(model, ["شركة", "مؤسسة التجارة"], src_vocab, trg_vocab, device, max_len=max_len)
+
+def load_artifacts(path: str, device: torch.device, mode: str = "fp32", script: bool = False, warm: bool = False,
+                   shortlist: bool = False, backend: str = INFERENCE_BACKEND):
     with open(os.path.join(path, "config.json"), "r", encoding="utf-8") as f:
         meta = json.load(f)
     cfg = ModelConfig(
@@ -51,14 +173,73 @@ def load_artifacts(path: str, device: torch.device):
         enc_dropout=meta["enc_dropout"],
         dec_dropout=meta["dec_dropout"],
     )
-    with open(os.path.join(path, "src_vocab.json"), "r", encoding="utf-8") as f:
-        src_vocab = vocab_from_json(json.load(f))
-    with open(os.path.join(path, "trg_vocab.json"), "r", encoding="utf-8") as f:
-        trg_vocab = vocab_from_json(json.load(f))
-    encoder = Encoder(len(src_vocab), cfg.encoder_embedding_size, cfg.hidden_size, cfg.num_layers, cfg.enc_dropout).to(device)
-    decoder = Decoder(len(trg_vocab), cfg.decoder_embedding_size, cfg.hidden_size, len(trg_vocab), cfg.num_layers, cfg.dec_dropout).to(device)
-    model = Seq2Seq(encoder, decoder, trg_vocab_size=len(trg_vocab)).to(device)
-    state = torch.load(os.path.join(path, "model.pt"), map_location=device)
-    model.load_state_dict(state)
+    src_vocab, trg_vocab = load_vocabs(path)
+    source = artifacts_fingerprint(path)
+    if backend == "onnx":
+        if device.type != "cpu" or mode != "fp32" or shortlist:
+            raise ValueError("the onnx backend runs the fp32 graphs on CPU only, without a shortlist")
+        from onnx_backend import load_onnx_model, ENCODER_ONNX, DECODER_ONNX
+        model = load_onnx_model(path, source=source)
+        graphs = (os.stat(os.path.join(path, name)) for name in (ENCODER_ONNX, DECODER_ONNX))
+        model.fingerprint = f"{source}:onnx:" + ":".join(f"{st.st_size}:{st.st_mtime_ns}" for st in graphs)
+        if warm:
+            warmup(model, src_vocab, trg_vocab, device)
+        return model, src_vocab, trg_vocab, cfg
+    if backend != "torch":
+        raise ValueError(f"Unknown inference backend '{backend}' (expected 'torch' or 'onnx')")
+    fingerprint = f"{source}:{mode}"
+    if mode == "int8":
+        if device.type != "cpu":
+            raise ValueError("int8 mode runs on CPU only")
+        model = build_model(cfg, len(src_vocab), len(trg_vocab))
+        state = load_quantized(path, source)
+        if state is not None:
+            model = quantize_model(model)  # quantized skeleton, then the saved int8 weights
+            model.load_state_dict(state)
+            st = os.stat(os.path.join(path, QUANTIZED_WEIGHTS))
+            fingerprint += f":{st.st_size}:{st.st_mtime_ns}"
+        else:
+            model.load_state_dict(load_state(os.path.join(path, "model.pt")))
+            model = quantize_model(model)
+    elif mode == "fp32":
+        # skeleton on the meta device (no allocation, no random init), then adopt the mmap'd tensors
+        state = load_state(os.path.join(path, "model.pt"))
+        try:
+            with torch.device("meta"):
+                model = build_model(cfg, len(src_vocab), len(trg_vocab))
+            model.load_state_dict(state, assign=True)
+        except (TypeError, AttributeError):
+            model = build_model(cfg, len(src_vocab), len(trg_vocab))
+            model.load_state_dict(state)
+        model = model.to(device)
+    else:
+        raise ValueError(f"Unknown load mode '{mode}' (expected 'fp32' or 'int8')")
     model.eval()
+    if shortlist:
+        # bound before scripting: a scripted int8 decoder no longer exposes its output weights
+        from shortlist import load_shortlist
+        model.shortlist = load_shortlist(path, src_vocab, trg_vocab).bind(model.decoder.fc)
+        st = os.stat(os.path.join(path, SHORTLIST_FILE))
+        fingerprint += f":shortlist:{st.st_size}:{st.st_mtime_ns}"
+    if script:
+        model = script_decoder(model)
+    model.fingerprint = fingerprint
+    if warm:
+        warmup(model, src_vocab, trg_vocab, device)
     return model, src_vocab, trg_vocab, cfg
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Pack the vocabs of an artifacts folder and time a cold load.")
+    ap.add_argument("artifacts")
+    ap.add_argument("--mode", choices=["fp32", "int8"], default="fp32")
+    args = ap.parse_args(argv)
+    save_packed_vocabs(args.artifacts, *load_vocabs(args.artifacts))
+    start = time.perf_counter()
+    model, src_vocab, trg_vocab, _ = load_artifacts(args.artifacts, torch.device("cpu"), mode=args.mode)
+    loaded = time.perf_counter()
+    warmup(model, src_vocab, trg_vocab, torch.device("cpu"))
+    print(f"{VOCAB_BLOB} written | load {1000 * (loaded - start):.1f} ms | warmup "
+          f"{1000 * (time.perf_counter() - loaded):.1f} ms", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
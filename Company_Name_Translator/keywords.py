@@ -0,0 +1,60 @@
+# Aho-Corasick keyword automaton: all (including multi-word) keys found in one left-to-right pass,
+# so lookup cost does not grow with the number of entries.
+from collections import deque
+
+class KeywordIndex:
+    def __init__(self):
+        self._goto = [{}]      # state -> {char: state}
+        self._fail = [0]
+        self._out = [[]]       # state -> [(key, kind, value)] ending exactly here
+        self._link = [0]       # state -> nearest fail-ancestor with outputs (0 = none)
+        self._built = False
+
+    def add(self, key: str, kind: str, value=None):
+        state = 0
+        for ch in key:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({}); self._fail.append(0); self._out.append([]); self._link.append(0)
+            state = nxt
+        self._out[state].append((key, kind, value))
+        self._built = False
+
+    def build(self):
+        queue = deque(self._goto[0].values())
+        for s in queue:
+            self._fail[s] = self._link[s] = 0
+        while queue:
+            s = queue.popleft()
+            for ch, nxt in self._goto[s].items():
+                f = self._fail[s]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                f = self._goto[f].get(ch, 0)
+                self._fail[nxt] = f
+                self._link[nxt] = f if self._out[f] else self._link[f]
+                queue.append(nxt)
+        self._built = True
+        return self
+
+    def finditer(self, s: str):
+        # yields (start, end, key, kind, value) for every occurrence, like `key in s` for all keys at once
+        if not self._built:
+            self.build()
+        goto, fail, out, link = self._goto, self._fail, self._out, self._link
+        state = 0
+        for i, ch in enumerate(s):
+            nxt = goto[state].get(ch)
+            while nxt is None and state:
+                state = fail[state]
+                nxt = goto[state].get(ch)
+            state = nxt or 0
+            hit = state if out[state] else link[state]
+            while hit:
+                for key, kind, value in out[hit]:
+                    yield i + 1 - len(key), i + 1, key, kind, value
+                hit = link[hit]
+
+    def __len__(self): return sum(len(o) for o in self._out)
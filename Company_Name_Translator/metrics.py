@@ -0,0 +1,146 @@
+# Opt-in pipeline instrumentation: per-stage latency histograms, route/cache counters and decode
+# lengths, exported as Prometheus text or a JSON snapshot. While nothing records (the default),
+# every hook is a single global check and no clock is read.
+#   metrics.enable()                      -> process-wide histograms (server.py --metrics)
+#   with metrics.trace() as tr: ...       -> per-request breakdown in tr.stages / tr.values (app.py debug panel)
+import time, bisect, threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from config import METRICS_ENABLED
+
+TIME_BUCKETS = tuple(1e-5 * 2 ** i for i in range(21))  # 10us .. ~10s
+COUNT_BUCKETS = tuple(float(2 ** i) for i in range(9))   # 1 .. 256
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum, self.count = 0.0, 0
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value; self.count += 1
+    def quantile(self, q: float) -> float:
+        # upper bound of the bucket holding the q-th observation (Prometheus-style estimate)
+        rank, seen = q * self.count, 0
+        for bound, c in zip(self.buckets, self.counts):
+            seen += c
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+class Trace:
+    __slots__ = ("stages", "values")
+    def __init__(self):
+        self.stages = {}  # stage -> seconds, summed over repeated stages
+        self.values = {}  # observed values (decode steps, ...), last one wins
+
+ENABLED = METRICS_ENABLED
+ACTIVE = ENABLED  # ENABLED or a trace is open somewhere; the only thing hooks look at
+_traces = 0
+_trace = ContextVar("metrics_trace", default=None)
+_lock = threading.Lock()
+_histograms = {}  # (name, labels) -> Histogram
+_counters = {}    # (name, labels) -> int
+
+def _refresh():
+    global ACTIVE
+    ACTIVE = ENABLED or _traces > 0
+
+def enable(on: bool = True):
+    global ENABLED
+    ENABLED = on
+    _refresh()
+
+def reset():
+    with _lock:
+        _histograms.clear(); _counters.clear()
+
+def _histogram(name: str, labels: tuple, buckets) -> Histogram:
+    h = _histograms.get((name, labels))
+    if h is None:
+        with _lock:
+            h = _histograms.setdefault((name, labels), Histogram(buckets))
+    return h
+
+# --- Hooks ---
+def clock() -> float:
+    # start of a stage; 0.0 (no clock read) while nothing records
+    return time.perf_counter() if ACTIVE else 0.0
+
+def stage(name: str, start: float):
+    if not ACTIVE:
+        return
+    dt = time.perf_counter() - start
+    tr = _trace.get()
+    if tr is not None:
+        tr.stages[name] = tr.stages.get(name, 0.0) + dt
+    if ENABLED:
+        _histogram("stage_seconds", (("stage", name),), TIME_BUCKETS).observe(dt)
+
+def observe(name: str, value: float, buckets=COUNT_BUCKETS):
+    if not ACTIVE:
+        return
+    tr = _trace.get()
+    if tr is not None:
+        tr.values[name] = value
+    if ENABLED:
+        _histogram(name, (), buckets).observe(value)
+
+def inc(name: str, labels: tuple = (), n: int = 1):
+    if not ENABLED:
+        return
+    key = (name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + n
+
+@contextmanager
+def trace():
+    # records the hooks hit by this thread/task into the yielded Trace, enabled or not
+    global _traces
+    tr = Trace()
+    token = _trace.set(tr)
+    with _lock:
+        _traces += 1; _refresh()
+    try:
+        yield tr
+    finally:
+        _trace.reset(token)
+        with _lock:
+            _traces -= 1; _refresh()
+
+# --- Export ---
+def _fmt_labels(labels, extra=()) -> str:
+    pairs = tuple(labels) + tuple(extra)
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else ""
+
+def to_prometheus(prefix: str = "s2s_") -> str:
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((k, (h.buckets, list(h.counts), h.sum, h.count)) for k, h in _histograms.items())
+    lines, typed = [], set()
+    for (name, labels), value in counters:
+        if name not in typed:
+            lines.append(f"# TYPE {prefix}{name} counter"); typed.add(name)
+        lines.append(f"{prefix}{name}{_fmt_labels(labels)} {value}")
+    for (name, labels), (buckets, counts, total, count) in histograms:
+        if name not in typed:
+            lines.append(f"# TYPE {prefix}{name} histogram"); typed.add(name)
+        seen = 0
+        for bound, c in zip(buckets, counts):
+            seen += c
+            lines.append(f"{prefix}{name}_bucket{_fmt_labels(labels, (('le', f'{bound:g}'),))} {seen}")
+        lines.append(f"{prefix}{name}_bucket{_fmt_labels(labels, (('le', '+Inf'),))} {count}")
+        lines.append(f"{prefix}{name}_sum{_fmt_labels(labels)} {total:.9g}")
+        lines.append(f"{prefix}{name}_count{_fmt_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+def snapshot() -> dict:
+    with _lock:
+        counters = {f"{n}{_fmt_labels(l)}": v for (n, l), v in sorted(_counters.items())}
+        histograms = {f"{n}{_fmt_labels(l)}": {"count": h.count, "sum": h.sum, "mean": h.sum / max(1, h.count),
+                                                "p50": h.quantile(0.5), "p90": h.quantile(0.9), "p99": h.quantile(0.99)}
+                      for (n, l), h in sorted(_histograms.items())}
+    hits, misses = counters.get("cache_hits_total", 0), counters.get("cache_misses_total", 0)
+    return {"enabled": ENABLED, "counters": counters, "histograms": histograms,
+            "cache_hit_rate": hits / (hits + misses) if hits + misses else None}
@@ -1,9 +1,10 @@
-import random
+import time, random
 import torch
 import torch.nn as nn
-from config import PAD_IDX, SOS_IDX, EOS_IDX
+from config import PAD_IDX, SOS_IDX, EOS_IDX, DECODE_LEN_RATIO, DECODE_LEN_EXTRA, REPEAT_MIN_REPEATS, REPEAT_MAX_PERIOD
 from tokenizers import tokenize_ar
 from vocab import Vocab
+import metrics
 
 class Encoder(nn.Module):
     def __init__(self, input_size, embedding_size, hidden_size, num_layers, p):
@@ -11,8 +12,11 @@ class Encoder(nn.Module):
         self.dropout = nn.Dropout(p)
         self.embedding = nn.Embedding(input_size, embedding_size)
         self.rnn = nn.LSTM(embedding_size, hidden_size, num_layers, dropout=p)
-    def forward(self, x):
+    def forward(self, x, lengths=None):
         embedding = self.dropout(self.embedding(x))
+        if lengths is not None:
+            # padded batch: pack so each sequence's final state ignores its padding
+            embedding = nn.utils.rnn.pack_padded_sequence(embedding, lengths.cpu(), enforce_sorted=False)
         outputs, (hidden, cell) = self.rnn(embedding)
         return hidden, cell
 
@@ -24,11 +28,19 @@ class Decoder(nn.Module):
         self.rnn = nn.LSTM(embedding_size, hidden_size, num_layers, dropout=p)
         self.fc = nn.Linear(hidden_size, output_size)
     def forward(self, x, hidden, cell):
+        outputs, hidden, cell = self.step(x, hidden, cell)
+        return self.fc(outputs), hidden, cell  # (N, vocab_size)
+    def step(self, x, hidden, cell):
+        # one step up to the top LSTM layer -> (N, hidden_size), before the output projection
         x = x.unsqueeze(0)  # (1, N)
         embedding = self.dropout(self.embedding(x))
         outputs, (hidden, cell) = self.rnn(embedding, (hidden, cell))
-        predictions = self.fc(outputs).squeeze(0)  # (N, vocab_size)
-        return predictions, hidden, cell
+        return outputs.squeeze(0), hidden, cell
+    def forward_sequence(self, x, hidden, cell):
+        # whole (T, N) input sequence in one LSTM call -> (T, N, vocab_size)
+        embedding = self.dropout(self.embedding(x))
+        outputs, _ = self.rnn(embedding, (hidden, cell))
+        return self.fc(outputs)
 
 class Seq2Seq(nn.Module):
     def __init__(self, encoder, decoder, trg_vocab_size: int):
@@ -36,7 +48,9 @@ class Seq2Seq(nn.Module):
         self.encoder = encoder
         self.decoder = decoder
         self.trg_vocab_size = trg_vocab_size
-    def forward(self, source, target, teacher_force_ratio=0.5):
+    def forward(self, source, target, teacher_force_ratio=0.5, parallel=False):
+        if parallel:
+            return self.forward_parallel(source, target, teacher_force_ratio)
         batch_size = source.shape[1]
         target_len = target.shape[0]
         outputs = torch.zeros(target_len, batch_size, self.trg_vocab_size, device=source.device)
@@ -48,21 +62,209 @@ class Seq2Seq(nn.Module):
             best_guess = output.argmax(1)
             x = target[t] if random.random() < teacher_force_ratio else best_guess
         return outputs
+    def forward_parallel(self, source, target, teacher_force_ratio=1.0):
+        # Returns (T-1, N, V) logits for target[1:]. With teacher_force_ratio < 1, scheduled sampling is
+        # done for the whole batch at once: a no-grad teacher-forced pass predicts every position, and
+        # a random (1 - ratio) share of the gold decoder inputs is replaced by those predictions.
+        hidden, cell = self.encoder(source)
+        inputs = target[:-1]
+        if teacher_force_ratio < 1.0:
+            with torch.no_grad():
+                preds = self.decoder.forward_sequence(inputs, hidden, cell).argmax(-1)  # preds[t] ~ target[t+1]
+            sampled = torch.cat([inputs[:1], preds[:-1]], dim=0)
+            replace = torch.rand(inputs.shape, device=inputs.device) >= teacher_force_ratio
+            replace[0] = False  # <sos> always stays
+            inputs = torch.where(replace, sampled, inputs)
+        return self.decoder.forward_sequence(inputs, hidden, cell)
 
-def greedy_translate(model: Seq2Seq, sentence_ar: str, src_vocab: Vocab, trg_vocab: Vocab, device, max_len=50):
+def encode_sources(sentences, src_vocab: Vocab, device):
+    src, lengths = src_vocab.encode_batch([tokenize_ar(s) for s in sentences])
+    return src.to(device), lengths  # (L, N), (N,)
+
+def output_projection(model: Seq2Seq, src):
+    # shortlist attached by load_artifacts -> (candidate ids, weight rows, bias rows) for this batch, else None
+    shortlist = getattr(model, "shortlist", None)
+    return None if shortlist is None else shortlist.projection(src)
+
+def decode_step(model: Seq2Seq, x, hidden, cell, proj=None):
+    # logits over the full vocabulary, or over the shortlist candidates only (column j is token proj[0][j])
+    if proj is None:
+        return model.decoder(x, hidden, cell)
+    outputs, hidden, cell = model.decoder.step(x, hidden, cell)
+    return torch.addmm(proj[2], outputs, proj[1].t()), hidden, cell
+
+# Why a sentence stopped decoding (return_status=True): EOS, its length limit, a repetition loop, or
+# the wall-clock deadline (output is partial; routing substitutes a fallback)
+STATUSES = ("ok", "length", "repetition", "deadline")
+OK, LENGTH, REPETITION, DEADLINE = range(4)
+
+def decode_limits(lengths, max_len: int, len_ratio=DECODE_LEN_RATIO, len_extra=DECODE_LEN_EXTRA):
+    # per-sentence output cap: ratio * source tokens + extra, never above max_len (lengths count <sos>/<eos>)
+    if len_ratio is None:
+        return torch.full_like(lengths, max_len)
+    return ((lengths - 2).clamp(min=1).float() * len_ratio + len_extra).ceil().long().clamp(max=max_len)
+
+def repeat_period(steps, min_repeats: int = REPEAT_MIN_REPEATS, max_period: int = REPEAT_MAX_PERIOD):
+    # (N,) smallest n-gram size p <= max_period repeated min_repeats times at the end of each row, else 0
+    n_tail = min(len(steps), max_period * min_repeats)
+    tail = torch.stack(steps[-n_tail:], dim=1)
+    period = torch.zeros(tail.shape[0], dtype=torch.long, device=tail.device)
+    for p in range(max_period, 0, -1):
+        span = p * min_repeats
+        if span > n_tail:
+            continue
+        seg = tail[:, -span:]
+        period = torch.where((seg[:, p:] == seg[:, :-p]).all(dim=1), p, period)
+    return period
+
+def _finish_status(codes, return_status):
+    if metrics.ENABLED or return_status:
+        codes = [STATUSES[c] for c in codes.tolist()]
+        for c in codes:
+            if c != "ok":
+                metrics.inc("decode_stops_total", (("reason", c),))
+    return codes
+
+def batch_greedy_translate(model: Seq2Seq, sentences, src_vocab: Vocab, trg_vocab: Vocab, device, max_len=50,
+                           deadline: float = None, return_status: bool = False):
+    # deadline: time.monotonic() value; rows still decoding then stop with status "deadline"
+    sentences = list(sentences)
+    if not sentences:
+        return ([], []) if return_status else []
     model.eval()
     with torch.no_grad():
-        src_tokens = [SOS_IDX] + src_vocab.lookup_indices(tokenize_ar(sentence_ar)) + [EOS_IDX]
-        src = torch.tensor(src_tokens, dtype=torch.long, device=device).unsqueeze(1)  # (L, 1)
-        hidden, cell = model.encoder(src)
-        x = torch.tensor([SOS_IDX], dtype=torch.long, device=device)
-        out_tokens = []
-        for _ in range(max_len):
-            logits, hidden, cell = model.decoder(x, hidden, cell)
-            x = logits.argmax(1)
-            token_id = x.item()
-            if token_id == EOS_IDX:
+        t0 = metrics.clock()
+        src, lengths = encode_sources(sentences, src_vocab, device)
+        hidden, cell = model.encoder(src, lengths)
+        metrics.stage("encode", t0)
+        t0 = metrics.clock()
+        n, dev = src.shape[1], src.device
+        limits = decode_limits(lengths, max_len).to(dev)
+        x = torch.full((n,), SOS_IDX, dtype=torch.long, device=dev)
+        finished = torch.zeros(n, dtype=torch.bool, device=dev)
+        status = torch.zeros(n, dtype=torch.long, device=dev)
+        keep = limits.clone()  # tokens kept per row; shortened when a repetition loop is cut
+        proj = output_projection(model, src)
+        # the all-finished check is a host sync; it is free on CPU, so only amortize it on accelerators
+        check_every = 1 if dev.type == "cpu" else 8
+        steps = []
+        for t in range(int(limits.max())):
+            logits, hidden, cell = decode_step(model, x, hidden, cell, proj)
+            x = logits.argmax(1) if proj is None else proj[0][logits.argmax(1)]
+            x = x.masked_fill(finished, PAD_IDX)
+            steps.append(x)
+            finished |= x == EOS_IDX
+            if REPEAT_MIN_REPEATS and t + 1 >= REPEAT_MIN_REPEATS:
+                period = repeat_period(steps).masked_fill(finished, 0)
+                looping = period > 0
+                keep = torch.where(looping, t + 1 - period * (REPEAT_MIN_REPEATS - 1), keep)  # one copy stays
+                status.masked_fill_(looping, REPETITION)
+                finished |= looping
+            too_long = ~finished & (limits <= t + 1)
+            status.masked_fill_(too_long, LENGTH)
+            finished |= too_long
+            if deadline is not None and time.monotonic() > deadline:
+                status.masked_fill_(~finished, DEADLINE)
+                break
+            if (t + 1) % check_every == 0 and bool(finished.all()):
                 break
-            if token_id not in (PAD_IDX, SOS_IDX):
-                out_tokens.append(token_id)
-        return " ".join(trg_vocab.lookup_tokens(out_tokens))
+        metrics.stage("decode_loop", t0)
+        metrics.observe("decode_steps", len(steps))
+        t0 = metrics.clock()
+        ids = torch.stack(steps, dim=1)  # (N, T)
+        ids = ids.masked_fill(torch.arange(ids.shape[1], device=dev) >= keep.unsqueeze(1), PAD_IDX)
+        out = trg_vocab.decode_batch(ids)  # single device->host copy
+        codes = _finish_status(status, return_status)
+        metrics.stage("detokenize", t0)
+    return (out, codes) if return_status else out
+
+def beam_translate(model: Seq2Seq, sentences, src_vocab: Vocab, trg_vocab: Vocab, device,
+                   beam_width=4, length_penalty=0.6, max_len=50, deadline: float = None, return_status: bool = False):
+    # per-sentence length limits, repetition cut and deadline as in batch_greedy_translate, applied per
+    # hypothesis: a looping one is frozen (trimmed to one copy of the loop) and competes with the others
+    sentences = list(sentences)
+    if not sentences:
+        return ([], []) if return_status else []
+    model.eval()
+    with torch.no_grad():
+        t0 = metrics.clock()
+        src, lengths = encode_sources(sentences, src_vocab, device)
+        hidden, cell = model.encoder(src, lengths)
+        metrics.stage("encode", t0)
+        t0 = metrics.clock()
+        n, k, dev = src.shape[1], beam_width, src.device
+        # all beams of all items live in one (N*K) batch: row b*K + j is beam j of item b
+        hidden = hidden.repeat_interleave(k, dim=1)
+        cell = cell.repeat_interleave(k, dim=1)
+        scores = torch.full((n, k), float("-inf"), device=dev)
+        scores[:, 0] = 0.0  # first step expands a single beam per item
+        finished = torch.zeros(n * k, dtype=torch.bool, device=dev)
+        out_len = torch.zeros(n * k, dtype=torch.long, device=dev)
+        seqs = torch.empty((n * k, 0), dtype=torch.long, device=dev)
+        x = torch.full((n * k,), SOS_IDX, dtype=torch.long, device=dev)
+        base = (torch.arange(n, device=dev) * k).unsqueeze(1)
+        limits = decode_limits(lengths, max_len).to(dev).repeat_interleave(k)
+        cut = torch.zeros(n * k, dtype=torch.bool, device=dev)  # hypothesis stopped by its length limit
+        looped = torch.zeros(n * k, dtype=torch.bool, device=dev)  # ... or by a repetition loop
+        keep = limits.clone()  # tokens kept per hypothesis
+        timed_out = False
+        check_every = 1 if dev.type == "cpu" else 8
+        pad_only = None
+        proj = output_projection(model, src)  # with a shortlist, specials keep their ids as positions
+        for t in range(int(limits.max())):
+            logits, hidden, cell = decode_step(model, x, hidden, cell, proj)
+            logp = torch.log_softmax(logits.float(), dim=-1)  # (N*K, V or candidates)
+            if pad_only is None:
+                pad_only = torch.full_like(logp[0], float("-inf"))
+                pad_only[PAD_IDX] = 0.0
+            # finished hypotheses are frozen: one zero-cost PAD continuation keeps their score and slot
+            logp = torch.where(finished.unsqueeze(1), pad_only, logp)
+            vocab_size = logp.shape[1]
+            cand = (scores.reshape(-1, 1) + logp).reshape(n, k * vocab_size)
+            scores, top = cand.topk(k, dim=1)
+            sel = (base + top // vocab_size).reshape(-1)  # parent beam rows
+            tok = (top % vocab_size).reshape(-1)
+            if proj is not None:
+                tok = proj[0][tok]
+            hidden, cell = hidden.index_select(1, sel), cell.index_select(1, sel)
+            finished, out_len = finished.index_select(0, sel), out_len.index_select(0, sel)
+            cut, looped, keep = cut.index_select(0, sel), looped.index_select(0, sel), keep.index_select(0, sel)
+            seqs = torch.cat([seqs.index_select(0, sel), tok.unsqueeze(1)], dim=1)
+            out_len += (~finished).long()
+            finished |= tok == EOS_IDX
+            if REPEAT_MIN_REPEATS and t + 1 >= REPEAT_MIN_REPEATS:
+                period = repeat_period(seqs[:, -REPEAT_MAX_PERIOD * REPEAT_MIN_REPEATS:].unbind(1))
+                looping = period.masked_fill(finished, 0) > 0
+                keep = torch.where(looping, out_len - period * (REPEAT_MIN_REPEATS - 1), keep)
+                looped |= looping
+                finished |= looping
+            too_long = ~finished & (limits <= t + 1)
+            cut |= too_long
+            finished |= too_long
+            x = tok
+            if deadline is not None and time.monotonic() > deadline:
+                timed_out = True
+                break
+            if (t + 1) % check_every == 0 and bool(finished.all()):
+                break
+        # GNMT length normalization, applied when choosing among the surviving hypotheses
+        norm = ((5.0 + out_len.clamp(min=1).float()) / 6.0) ** length_penalty
+        best = (scores.reshape(-1) / norm).reshape(n, k).argmax(dim=1)
+        best_rows = base.squeeze(1) + best
+        best_seqs = seqs.index_select(0, best_rows)
+        trimmed = torch.arange(seqs.shape[1], device=dev) >= keep.index_select(0, best_rows).unsqueeze(1)
+        best_seqs = best_seqs.masked_fill(trimmed, PAD_IDX)
+        status = cut.index_select(0, best_rows).long() * LENGTH
+        status.masked_fill_(looped.index_select(0, best_rows), REPETITION)
+        if timed_out:
+            status.masked_fill_(~finished.index_select(0, best_rows), DEADLINE)
+        metrics.stage("decode_loop", t0)
+        metrics.observe("decode_steps", seqs.shape[1])
+        t0 = metrics.clock()
+        out = trg_vocab.decode_batch(best_seqs)
+        codes = _finish_status(status, return_status)
+        metrics.stage("detokenize", t0)
+    return (out, codes) if return_status else out
+
+def greedy_translate(model: Seq2Seq, sentence_ar: str, src_vocab: Vocab, trg_vocab: Vocab, device, max_len=50):
+    return batch_greedy_translate(model, [sentence_ar], src_vocab, trg_vocab, device, max_len=max_len)[0]
@@ -0,0 +1,154 @@
+# ONNX Runtime inference backend. The encoder and one decoder step are exported as ONNX graphs (dynamic
+# batch/length axes) next to model.pt; OnnxSeq2Seq runs them with the same encoder(src, lengths) /
+# decoder(x, hidden, cell) interface as Seq2Seq, so the greedy/beam loops in model.py (and routing,
+# batch, server on top) work on either backend. Export once and check parity against PyTorch:
+#   python onnx_backend.py [--artifacts artifacts_ar_en] [--eval-file manual_input.xlsx]
+# then INFERENCE_BACKEND = "onnx" in config.py, or --backend onnx for batch.py / server.py.
+import os, sys, json, argparse
+import torch
+
+ENCODER_ONNX = "encoder.onnx"
+DECODER_ONNX = "decoder_step.onnx"
+ONNX_OPSET = 17
+SOURCE_KEY = "source_fingerprint"  # graph metadata: artifacts_fingerprint of the model.pt it was exported from
+
+def _export(module, args, file, input_names, output_names, dynamic_axes, opset):
+    # TorchScript-based exporter: it maps pack_padded_sequence onto the ONNX LSTM's sequence_lens
+    kwargs = dict(input_names=input_names, output_names=output_names, dynamic_axes=dynamic_axes, opset_version=opset)
+    try:
+        torch.onnx.export(module, args, file, dynamo=False, **kwargs)
+    except TypeError:  # torch without the dynamo switch
+        torch.onnx.export(module, args, file, **kwargs)
+
+def _stamp(file: str, source: str):
+    import onnx
+    graph = onnx.load(file)
+    onnx.helper.set_model_props(graph, {SOURCE_KEY: source})
+    onnx.save(graph, file)
+
+def export_onnx(model, path: str, opset: int = ONNX_OPSET):
+    # model must be the one saved in path: both graphs are stamped with its artifacts fingerprint
+    from io_artifacts import artifacts_fingerprint
+    source = artifacts_fingerprint(path)
+    model = model.cpu().eval()
+    src = torch.full((3, 2), 4, dtype=torch.long)  # example inputs only fix dtypes and ranks
+    lengths = torch.tensor([3, 2])
+    with torch.no_grad():
+        hidden, cell = model.encoder(src, lengths)
+        _export(model.encoder, (src, lengths), os.path.join(path, ENCODER_ONNX), ["src", "lengths"], ["hidden", "cell"],
+                {"src": {0: "src_len", 1: "batch"}, "lengths": {0: "batch"},
+                 "hidden": {1: "batch"}, "cell": {1: "batch"}}, opset)
+        x = torch.full((2,), 1, dtype=torch.long)
+        _export(model.decoder, (x, hidden, cell), os.path.join(path, DECODER_ONNX), ["x", "hidden", "cell"],
+                ["logits", "hidden_out", "cell_out"],
+                {"x": {0: "batch"}, "hidden": {1: "batch"}, "cell": {1: "batch"},
+                 "logits": {0: "batch"}, "hidden_out": {1: "batch"}, "cell_out": {1: "batch"}}, opset)
+    for name in (ENCODER_ONNX, DECODER_ONNX):
+        _stamp(os.path.join(path, name), source)
+
+class OrtEncoder:
+    def __init__(self, session):
+        self.session = session
+    def __call__(self, src, lengths):
+        hidden, cell = self.session.run(None, {"src": src.cpu().numpy(), "lengths": lengths.cpu().numpy()})
+        return torch.from_numpy(hidden), torch.from_numpy(cell)
+
+class OrtDecoder:
+    def __init__(self, session):
+        self.session = session
+    def __call__(self, x, hidden, cell):
+        logits, hidden, cell = self.session.run(None, {"x": x.contiguous().numpy(), "hidden": hidden.contiguous().numpy(),
+                                                       "cell": cell.contiguous().numpy()})
+        return torch.from_numpy(logits), torch.from_numpy(hidden), torch.from_numpy(cell)
+
+class OnnxSeq2Seq:
+    # inference-only stand-in for Seq2Seq (CPU tensors in and out); no shortlist or TorchScript
+    def __init__(self, encoder: OrtEncoder, decoder: OrtDecoder):
+        self.encoder, self.decoder = encoder, decoder
+    def eval(self):
+        return self
+
+def load_onnx_model(path: str, threads: int = None, source: str = None) -> OnnxSeq2Seq:
+    # source: expected artifacts fingerprint; graphs exported from another model.pt are refused
+    import onnxruntime as ort
+    files = [os.path.join(path, name) for name in (ENCODER_ONNX, DECODER_ONNX)]
+    for file in files:
+        if not os.path.exists(file):
+            raise FileNotFoundError(f"No ONNX graph at {file} (export it with: python onnx_backend.py --artifacts {path})")
+    opts = ort.SessionOptions()
+    if threads:
+        opts.intra_op_num_threads = threads
+    enc, dec = (ort.InferenceSession(f, opts, providers=["CPUExecutionProvider"]) for f in files)
+    if source is not None:
+        for file, session in zip(files, (enc, dec)):
+            if session.get_modelmeta().custom_metadata_map.get(SOURCE_KEY) != source:
+                raise ValueError(f"{file} was not exported from the current model.pt "
+                                 f"(re-export it with: python onnx_backend.py --artifacts {path})")
+    return OnnxSeq2Seq(OrtEncoder(enc), OrtDecoder(dec))
+
+def max_state_diff(model, onnx_model, src_vocab, sentences) -> float:
+    # largest absolute difference of encoder states and first-step logits between the two backends
+    from model import encode_sources
+    from config import SOS_IDX
+    src, lengths = encode_sources(sentences, src_vocab, torch.device("cpu"))
+    with torch.no_grad():
+        states = [m.encoder(src, lengths) for m in (model, onnx_model)]
+        x = torch.full((src.shape[1],), SOS_IDX, dtype=torch.long)
+        steps = [m.decoder(x, h, c) for m, (h, c) in zip((model, onnx_model), states)]
+    return max(float((a - b).abs().max()) for a, b in zip(states[0] + steps[0], states[1] + steps[1]))
+
+def main(argv=None):
+    from config import ARTIFACTS_DIR
+    from io_artifacts import load_artifacts
+    from model import beam_translate
+    from quantize import held_out_sentences, timed_decode, compare
+
+    ap = argparse.ArgumentParser(description="Export the encoder and decoder step to ONNX and check parity with PyTorch.")
+    ap.add_argument("--artifacts", default=ARTIFACTS_DIR)
+    ap.add_argument("--opset", type=int, default=ONNX_OPSET)
+    ap.add_argument("--eval-file", default=None, help="CSV/XLSX of held-out inputs (default: dataset test split)")
+    ap.add_argument("--column", default="Original_Arabic_Name")
+    ap.add_argument("--limit", type=int, default=500)
+    ap.add_argument("--batch-size", type=int, default=32)
+    ap.add_argument("--beam-width", type=int, default=4, help="also compare beam search outputs (0 = skip)")
+    ap.add_argument("--tolerance", type=float, default=1e-4, help="max allowed state/logit difference")
+    args = ap.parse_args(argv)
+
+    device = torch.device("cpu")
+    model, src_vocab, trg_vocab, _ = load_artifacts(args.artifacts, device, warm=True, backend="torch")
+    export_onnx(model, args.artifacts, args.opset)
+    onnx_model, _, _, _ = load_artifacts(args.artifacts, device, warm=True, backend="onnx")
+
+    sentences = held_out_sentences(args.eval_file, args.column, args.limit)
+    diff = max(max_state_diff(model, onnx_model, src_vocab, sentences[i:i + args.batch_size])
+               for i in range(0, len(sentences), args.batch_size)) if sentences else 0.0
+    ref, t_torch = timed_decode(model, sentences, src_vocab, trg_vocab, device, args.batch_size)
+    out, t_onnx = timed_decode(onnx_model, sentences, src_vocab, trg_vocab, device, args.batch_size)
+    n = max(1, len(sentences))
+    report = {
+        "sentences": len(sentences),
+        "batch_size": args.batch_size,
+        "opset": args.opset,
+        "max_abs_diff": diff,
+        "parity": diff <= args.tolerance,
+        "torch_ms_per_sentence": 1000 * t_torch / n,
+        "onnx_ms_per_sentence": 1000 * t_onnx / n,
+        "speedup": t_torch / max(1e-9, t_onnx),
+        **{f"greedy_{k}": v for k, v in compare(ref, out).items()},
+    }
+    if args.beam_width > 1:
+        beams = [[], []]
+        for i in range(0, len(sentences), args.batch_size):
+            for outs, m in zip(beams, (model, onnx_model)):
+                outs += beam_translate(m, sentences[i:i + args.batch_size], src_vocab, trg_vocab, device,
+                                       beam_width=args.beam_width)
+        report.update({f"beam{args.beam_width}_{k}": v for k, v in compare(*beams).items()})
+    with open(os.path.join(args.artifacts, "onnx_report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    if not report["parity"]:
+        sys.exit(f"ONNX outputs differ from PyTorch by {diff:.3g} (> {args.tolerance:g})")
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
 import re
-from translit import ar_normalize, AR_DIACRITICS, BASE
+from functools import lru_cache
+from translit import ar_normalize, strip_diacritics, transliterate_simple as translit_simple
+from keywords import KeywordIndex
+from config import GLOSSARY_PATH
+import metrics
 # Helpers
 AR_LETTERS = re.compile(r"[\u0600-\u06FF]+")
-def strip_diacritics(s: str) -> str: return re.sub(f"[{AR_DIACRITICS}]", "", s)
 def has_al_prefix(tok: str) -> bool: return tok.startswith("ال")
 def has_ll_prefix(tok: str) -> bool: return tok.startswith("لل") or tok.startswith("لﻟ")
 def drop_al(tok: str) -> str: return tok[2:] if has_al_prefix(tok) else tok
@@ -27,41 +30,117 @@ BUSINESS_MAP = {
     "البناء":"Construction",
 }
 ORG_TYPE_TOKENS = {"شركة","شركه","مجموعة","مكتب","بنك","مصرف","قابضة","القابضة"}
+ORG_KEYS = {"شركة","شركه","مجموعة","بنك","مصرف","قابضة","القابضة","قابضه","ش.م.ع","ش م ع","ش.ذ.م.م","ش ذ م م"}
+ORG_NAMES_EN = {"Company","Office","Bank","Group","Holding"}
 
-def translit_simple(tok: str) -> str:
-    al = ""
-    if has_al_prefix(tok):
-        tok_wo = drop_al(tok); al = "Al-"
-    else:
-        tok_wo = tok
-    out = "".join(BASE.get(ch, ch) for ch in tok_wo)
-    out = re.sub(r"\b(q|k|m|b|f|s|d|t|r|n|l)([bcdfghjklmnpqrstvwxyz])", r"\1a\2", out)
-    out = re.sub(r"\'(?=[aeiou])", "", out).replace("--","-").strip("-")
-    out = out.capitalize()
-    return (al + out) if al else out
+# One automaton over every table, shared by routing (org keys) and rendering (multi-word entries);
+# rebuilt with the glossary's org keys whenever the glossary version changes
+def build_keywords(glossary=None) -> KeywordIndex:
+    index = KeywordIndex()
+    for k in ORG_KEYS: index.add(k, "org")
+    for k in ORG_TYPE_TOKENS: index.add(k, "org_type")
+    for k, v in BUSINESS_MAP.items(): index.add(k, "business", v)
+    for k, v in LEXICAL_MAP.items(): index.add(k, "lexical", v)
+    if glossary is not None:
+        for k in glossary.keys("org"): index.add(k, "org")
+    return index.build()
 
-def normalize_tokens_ar(text: str) -> list:
+KEYWORDS, _keywords_version = build_keywords(), None
+
+def _sync_keywords():
+    global KEYWORDS, _keywords_version
+    version = _glossary.current_version() if _glossary is not None else None
+    if version != _keywords_version:
+        KEYWORDS, _keywords_version = build_keywords(_glossary), version
+        _scan.cache_clear()
+    return version
+
+@lru_cache(maxsize=4096)
+def _scan(text: str, version):
     s = ar_normalize(text)
-    s = strip_diacritics(s)
-    return s.split()
+    return s, tuple(KEYWORDS.finditer(s))
+
+def scan_org_text(text: str):
+    # cached so is_likely_name + render_org_name_en on the same input share a single scan
+    return _scan(text, _sync_keywords())
+scan_org_text.cache_clear = _scan.cache_clear
+
+def _phrase_spans(s: str, matches) -> dict:
+    # multi-word business/lexical entries aligned to token boundaries (optionally after an ال/لل prefix)
+    starts, ends, pos = {}, {}, 0
+    for i, tok in enumerate(s.split(" ")):
+        starts[pos] = i
+        if has_al_prefix(tok) or has_ll_prefix(tok):
+            starts.setdefault(pos + 2, i)
+        pos += len(tok)
+        ends[pos] = i + 1
+        pos += 1
+    spans = {}
+    for start, end, key, kind, value in matches:
+        if " " not in key or kind not in ("business", "lexical") or start not in starts or end not in ends:
+            continue
+        i, n = starts[start], ends[end] - starts[start]
+        if n > spans.get(i, (0,))[0]:
+            spans[i] = (n, kind, value)
+    return spans
+
+# Optional external glossary (see glossary.py), consulted after the built-in maps
+_glossary = None
+
+def load_glossary(path: str):
+    global _glossary
+    from glossary import Glossary  # sqlite3 & co. only when a glossary is configured
+    if _glossary is not None:
+        _glossary.close()
+    _glossary = Glossary(path) if path else None
+    return _glossary
+
+if GLOSSARY_PATH:
+    load_glossary(GLOSSARY_PATH)
+
+def get_glossary(): return _glossary
+
+def normalize_tokens_ar(text: str) -> list:
+    # ar_normalize already drops diacritics, so tokens below need no further normalization
+    return ar_normalize(text).split()
+
+def _place(kind: str, en: str, body_en: list, business_bits: list, org_suffix: list):
+    if kind == "lexical":
+        body_en.append(en)
+    elif kind == "org" or en in ORG_NAMES_EN:
+        org_suffix.append(en)
+    else:
+        business_bits.append(en)
 
 def render_org_name_en(text: str) -> str:
-    toks = normalize_tokens_ar(text)
+    t0 = metrics.clock()
+    s, matches = scan_org_text(text)
+    metrics.stage("normalize_scan", t0)
+    toks = s.split()
+    spans = _phrase_spans(s, matches)
     body_en, business_bits, org_suffix = [], [], []
-    for tok in toks:
-        t = tok
+    i = 0
+    while i < len(toks):
+        hit = spans.get(i) or (_glossary.lookup_phrase(toks, i) if _glossary is not None else None)
+        if hit is not None:
+            n, kind, value = hit
+            i += n
+            _place(kind, value, body_en, business_bits, org_suffix)
+            continue
+        t = toks[i]
+        i += 1
         if has_ll_prefix(t):
             t_no_ll = drop_ll(t)
-            key_ll = ar_normalize(t_no_ll)
-            if key_ll in BUSINESS_MAP and BUSINESS_MAP[key_ll] not in {"Company","Office","Bank","Group","Holding"}:
+            key_ll = t_no_ll
+            if key_ll in BUSINESS_MAP and BUSINESS_MAP[key_ll] not in ORG_NAMES_EN:
                 business_bits.append(BUSINESS_MAP[key_ll]); continue
             t = t_no_ll
-        key = ar_normalize(t)
+        key = t
         if key in ORG_TYPE_TOKENS:
             org_suffix.append(BUSINESS_MAP.get(key, "Company")); continue
         if key in BUSINESS_MAP:
             eng = BUSINESS_MAP[key]
-            if eng not in {"Company","Office","Bank","Group","Holding"}:
+            if eng not in ORG_NAMES_EN:
                 business_bits.append(eng)
             continue
         if key in LEXICAL_MAP:
@@ -69,21 +148,35 @@ def render_org_name_en(text: str) -> str:
             if has_al_prefix(t) and not en.lower().startswith("al-"):
                 en = "Al-" + en
             body_en.append(en); continue
+        if _glossary is not None:
+            hit, al = _glossary.lookup(t), ""
+            if hit is None and has_al_prefix(t):
+                hit, al = _glossary.lookup(drop_al(t)), "Al-"
+            if hit is not None:
+                kind, en = hit
+                if kind == "lexical" and al and not en.lower().startswith("al-"):
+                    en = "Al-" + en
+                _place(kind, en, body_en, business_bits, org_suffix)
+                continue
         if has_al_prefix(t):
             base = drop_al(t); en = translit_simple(base)
             body_en.append("Al-" + en)
         else:
             body_en.append(translit_simple(t))
-    # de-dup labels
+    # de-dup labels; a one-word label already inside a phrase label goes too ("Payment" / "Payment Services")
+    phrase_words = {w for b in business_bits if " " in b for w in b.split()}
     labels, seen = [], set()
     for b in business_bits:
-        if b not in seen:
+        if b not in seen and (" " in b or b not in phrase_words):
             labels.append(b); seen.add(b)
     # suffix choice
     suffix_choice = None
     if org_suffix:
         for cand in ["Bank","Office","Group","Holding","Company"]:
             if cand in org_suffix: suffix_choice = cand; break
+        if suffix_choice is None:
+            # a glossary org label ("Establishment", ...) before the generic fallback
+            suffix_choice = next((o for o in org_suffix if o not in ORG_NAMES_EN), None)
     if suffix_choice is None: suffix_choice = "Company"
     # compose suffix
     suffix = " ".join(labels + [suffix_choice]) if labels else suffix_choice
@@ -93,4 +186,5 @@ def render_org_name_en(text: str) -> str:
     if suffix: result = (result + " " + suffix).strip()
     result = re.sub(r"\s+", " ", result)
     result = re.sub(r"\b[Aa]l[- ]", "Al-", result)
+    metrics.stage("render", t0)
     return result
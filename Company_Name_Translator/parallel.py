@@ -0,0 +1,47 @@
+# Process-pool batch mode for the pure-Python paths (renderer / transliteration), which are GIL-bound.
+import os
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+import org_renderer
+from org_renderer import render_org_name_en
+from translit import transliterate_arabic_name
+
+# Workers import this module once (or inherit it on fork), so LEXICAL_MAP/BUSINESS_MAP and the
+# compiled regexes are built once per worker, not per task.
+def _render_chunk(texts): return [render_org_name_en(t) for t in texts]
+def _translit_chunk(texts): return [transliterate_arabic_name(t) for t in texts]
+
+def _init_worker(glossary_path):
+    # fork inherits the parent's glossary; spawn/forkserver workers need it loaded explicitly
+    g = org_renderer.get_glossary()
+    if glossary_path and (g is None or g.path != glossary_path):
+        org_renderer.load_glossary(glossary_path)
+
+def make_pool(workers: int = None) -> ProcessPoolExecutor:
+    g = org_renderer.get_glossary()
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                               initargs=(g.path if g is not None else None,))
+
+def _map_chunks(chunk_fn, texts, workers, chunksize, executor):
+    ex = executor or make_pool(workers)
+    max_inflight = 4 * (workers or os.cpu_count())
+    try:
+        it = iter(texts)
+        pending = deque()
+        # bounded window of in-flight chunks: ordered output, bounded memory for huge/streamed inputs
+        for chunk in iter(lambda: list(islice(it, chunksize)), []):
+            pending.append(ex.submit(chunk_fn, chunk))
+            if len(pending) >= max_inflight:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        if executor is None:
+            ex.shutdown(cancel_futures=True)
+
+def render_many(texts, workers: int = None, chunksize: int = 512, executor=None):
+    return _map_chunks(_render_chunk, texts, workers, chunksize, executor)
+
+def transliterate_many(texts, workers: int = None, chunksize: int = 512, executor=None):
+    return _map_chunks(_translit_chunk, texts, workers, chunksize, executor)
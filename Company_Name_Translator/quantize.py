@@ -0,0 +1,72 @@
+# Build the INT8 CPU model next to model.pt and report accuracy vs latency against fp32:
+#   python quantize.py [--artifacts artifacts_ar_en] [--eval-file manual_input.xlsx]
+import os, sys, json, time, argparse
+import torch
+import pandas as pd
+
+from config import ARTIFACTS_DIR
+from io_artifacts import load_artifacts, quantize_model, script_decoder, save_quantized, QUANTIZED_WEIGHTS
+from model import batch_greedy_translate
+from data_loading import load_ar_en_splits
+
+def held_out_sentences(eval_file: str = None, column: str = "Original_Arabic_Name", limit: int = 500):
+    if eval_file:
+        df = pd.read_excel(eval_file) if eval_file.lower().endswith((".xlsx", ".xls")) else pd.read_csv(eval_file)
+        return [str(x) for x in df[column].head(limit)]
+    return [rec["translation"]["ar"] for rec in list(load_ar_en_splits()["test"])[:limit]]
+
+def timed_decode(model, sentences, src_vocab, trg_vocab, device, batch_size: int):
+    outs, start = [], time.perf_counter()
+    for i in range(0, len(sentences), batch_size):
+        outs += batch_greedy_translate(model, sentences[i:i + batch_size], src_vocab, trg_vocab, device)
+    return outs, time.perf_counter() - start
+
+def compare(reference, candidate) -> dict:
+    exact = sum(a == b for a, b in zip(reference, candidate))
+    tok_same = tok_total = 0
+    for a, b in zip(reference, candidate):
+        a, b = a.split(), b.split()
+        tok_same += sum(x == y for x, y in zip(a, b))
+        tok_total += max(len(a), len(b))
+    return {"exact_match": exact / max(1, len(reference)), "token_agreement": tok_same / max(1, tok_total)}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Quantize the saved model to INT8 and report accuracy vs latency.")
+    ap.add_argument("--artifacts", default=ARTIFACTS_DIR)
+    ap.add_argument("--eval-file", default=None, help="CSV/XLSX of held-out inputs (default: dataset test split)")
+    ap.add_argument("--column", default="Original_Arabic_Name")
+    ap.add_argument("--limit", type=int, default=500)
+    ap.add_argument("--batch-size", type=int, default=32)
+    ap.add_argument("--no-script", action="store_true", help="skip TorchScript for the decoder step")
+    args = ap.parse_args(argv)
+
+    device = torch.device("cpu")
+    fp32, src_vocab, trg_vocab, _ = load_artifacts(args.artifacts, device)
+    int8, _, _, _ = load_artifacts(args.artifacts, device)
+    int8 = quantize_model(int8)
+    save_quantized(args.artifacts, int8)
+    if not args.no_script:
+        int8 = script_decoder(int8)
+
+    sentences = held_out_sentences(args.eval_file, args.column, args.limit)
+    ref, t_fp32 = timed_decode(fp32, sentences, src_vocab, trg_vocab, device, args.batch_size)
+    out, t_int8 = timed_decode(int8, sentences, src_vocab, trg_vocab, device, args.batch_size)
+    n = max(1, len(sentences))
+    report = {
+        "sentences": len(sentences),
+        "batch_size": args.batch_size,
+        "scripted_decoder": not args.no_script,
+        "fp32_ms_per_sentence": 1000 * t_fp32 / n,
+        "int8_ms_per_sentence": 1000 * t_int8 / n,
+        "speedup": t_fp32 / max(1e-9, t_int8),
+        "fp32_weights_mb": os.path.getsize(os.path.join(args.artifacts, "model.pt")) / 2**20,
+        "int8_weights_mb": os.path.getsize(os.path.join(args.artifacts, QUANTIZED_WEIGHTS)) / 2**20,
+        **compare(ref, out),
+    }
+    with open(os.path.join(args.artifacts, "quantize_report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,142 @@
-import re
-from org_renderer import render_org_name_en
-from model import greedy_translate
-from translit import ar_normalize
+import re, time
+from itertools import islice
+from org_renderer import render_org_name_en, scan_org_text, ORG_KEYS
+from tokenizers import tokenize_ar
+from translit import transliterate_arabic_name
+from cache import model_fingerprint, renderer_fingerprint
+from config import DECODE_LEN_RATIO, DECODE_LEN_EXTRA, REPEAT_MIN_REPEATS, REPEAT_MAX_PERIOD
+import metrics
 
-ORG_KEYS = {"شركة","شركه","مجموعة","بنك","مصرف","قابضة","القابضة","قابضه","ش.م.ع","ش م ع","ش.ذ.م.م","ش ذ م م"}
+_SENTENCE_PUNCT = re.compile(r"[؟\?\!\;\,\:]")
 def is_arabic_char(c): return '\u0600' <= c <= '\u06FF' or c in {' ', '.'}
 
 def is_likely_name(text: str) -> bool:
-    s = ar_normalize(text)
+    s, matches = scan_org_text(text)
     if not s: return False
     ratio = sum(1 for ch in s if is_arabic_char(ch)) / max(1, len(s))
     if ratio < 0.6: return False
-    if any(k in s for k in ORG_KEYS): return True
+    if any(m[3] == "org" for m in matches): return True
     toks = s.split()
-    return len(toks) <= 8 and not re.search(r"[؟\?\!\;\,\:]", s)
+    return len(toks) <= 8 and not _SENTENCE_PUNCT.search(s)
 
-def translate_smart(model, sentence_ar: str, src_vocab, trg_vocab, device, max_len=50):
-    if is_likely_name(sentence_ar):
-        return render_org_name_en(sentence_ar)
-    return greedy_translate(model, sentence_ar, src_vocab, trg_vocab, device, max_len=max_len)
+# decode limits change model outputs as much as the weights do, so they are part of the model-route key
+DECODE_LIMITS_KEY = f"{DECODE_LEN_RATIO}:{DECODE_LEN_EXTRA}:{REPEAT_MIN_REPEATS}:{REPEAT_MAX_PERIOD}"
+
+def cache_key(cache, model, text: str, is_name: bool, max_len: int, beam_width: int = 1, length_penalty: float = 0.6):
+    if is_name:
+        return cache.key(text, "renderer", renderer_fingerprint())
+    return cache.key(text, "model",
+                     f"{model_fingerprint(model)}:{max_len}:{beam_width}:{length_penalty}:{DECODE_LIMITS_KEY}")
+
+def fallback_translation(text: str) -> str:
+    # answer for a request whose decode ran out of time: rendered if it looks like a name, else transliterated
+    return render_org_name_en(text) if is_likely_name(text) else transliterate_arabic_name(text)
+
+def decode_batch(model, sentences, src_vocab, trg_vocab, device, max_len=50, beam_width=1, length_penalty=0.6,
+                 deadline=None, return_status=False):
+    # model (and torch) imported on first use: renderer-only callers never load it
+    from model import batch_greedy_translate, beam_translate
+    if beam_width > 1:
+        return beam_translate(model, sentences, src_vocab, trg_vocab, device, beam_width=beam_width,
+                              length_penalty=length_penalty, max_len=max_len, deadline=deadline,
+                              return_status=return_status)
+    return batch_greedy_translate(model, sentences, src_vocab, trg_vocab, device, max_len=max_len,
+                                  deadline=deadline, return_status=return_status)
+
+def translate_smart(model, sentence_ar: str, src_vocab, trg_vocab, device, max_len=50, cache=None,
+                    beam_width=1, length_penalty=0.6, deadline_s=None, return_status=False):
+    # deadline_s: wall-clock budget for the model decode; past it the request gets fallback_translation.
+    # return_status -> (translation, "ok" | "length" | "repetition" | "fallback")
+    deadline = None if deadline_s is None else time.monotonic() + deadline_s
+    t0 = metrics.clock()
+    is_name = is_likely_name(sentence_ar)
+    metrics.stage("route", t0)
+    metrics.inc("requests_total", (("route", "renderer" if is_name else "model"),))
+    key = None
+    if cache is not None:
+        key = cache_key(cache, model, sentence_ar, is_name, max_len, beam_width, length_penalty)
+        out = cache.get(key)
+        metrics.inc("cache_misses_total" if out is None else "cache_hits_total")
+        if out is not None:
+            return (out, "ok") if return_status else out
+    status = "ok"
+    if is_name:
+        out = render_org_name_en(sentence_ar)
+    else:
+        outs, codes = decode_batch(model, [sentence_ar], src_vocab, trg_vocab, device, max_len=max_len,
+                                   beam_width=beam_width, length_penalty=length_penalty, deadline=deadline,
+                                   return_status=True)
+        out, status = outs[0], codes[0]
+        if status == "deadline":
+            out, status = fallback_translation(sentence_ar), "fallback"
+            metrics.inc("deadline_fallbacks_total")
+    if key is not None and status != "fallback":  # a fallback is not the model's answer; don't pin it
+        cache.put(key, out)
+    return (out, status) if return_status else out
+
+def render_if_name(text: str):
+    return render_org_name_en(text) if is_likely_name(text) else None
+
+def _translate_chunk(model, texts, src_vocab, trg_vocab, device, max_len, batch_size, executor=None, cache=None,
+                     beam_width=1, length_penalty=0.6, deadline=None):
+    results, fallback = [None] * len(texts), set()
+    todo = list(range(len(texts)))
+    if cache is not None:
+        # one computation per distinct key; cached keys are filled in directly
+        keys, first, todo = [None] * len(texts), {}, []
+        for i, text in enumerate(texts):
+            keys[i] = key = cache_key(cache, model, text, is_likely_name(text), max_len, beam_width, length_penalty)
+            if key in first:
+                continue
+            first[key] = i
+            results[i] = cache.get(key)
+            if results[i] is None:
+                todo.append(i)
+    pending = [texts[i] for i in todo]
+    if executor is not None:
+        # routing + rendering are pure Python; fan them out to the pool, decode here
+        rendered = list(executor.map(render_if_name, pending, chunksize=256))
+    else:
+        rendered = [render_if_name(t) for t in pending]
+    model_idx = []
+    for i, r in zip(todo, rendered):
+        if r is None:
+            model_idx.append(i)
+        else:
+            results[i] = r
+    # length-sorted batches keep padding (and wasted decoder work) low
+    model_idx.sort(key=lambda i: len(tokenize_ar(texts[i])))
+    for start in range(0, len(model_idx), batch_size):
+        idx = model_idx[start:start + batch_size]
+        if deadline is not None and time.monotonic() > deadline:
+            outs, codes = [None] * len(idx), ["deadline"] * len(idx)  # out of time: don't start the batch
+        else:
+            outs, codes = decode_batch(model, [texts[i] for i in idx], src_vocab, trg_vocab, device, max_len=max_len,
+                                       beam_width=beam_width, length_penalty=length_penalty, deadline=deadline,
+                                       return_status=True)
+        for i, out, code in zip(idx, outs, codes):
+            if code == "deadline":
+                out = fallback_translation(texts[i])
+                fallback.add(i)
+                metrics.inc("deadline_fallbacks_total")
+            results[i] = out
+    if cache is not None:
+        for i in todo:
+            if i not in fallback:  # a fallback is not the model's answer; don't pin it
+                cache.put(keys[i], results[i])
+        results = [results[first[k]] for k in keys]
+    return results
+
+def translate_many(model, texts, src_vocab, trg_vocab, device, max_len=50, batch_size=64, chunk_size=4096,
+                   executor=None, cache=None, beam_width=1, length_penalty=0.6, deadline_s=None):
+    # texts may be any iterable; results are yielded in input order, holding at most chunk_size rows.
+    # deadline_s: wall-clock budget for the model decodes of the whole call (from the first result on);
+    # rows not decoded in time get fallback_translation, as in translate_smart
+    deadline = None if deadline_s is None else time.monotonic() + deadline_s
+    it = iter(texts)
+    while True:
+        chunk = list(islice(it, chunk_size))
+        if not chunk:
+            return
+        yield from _translate_chunk(model, chunk, src_vocab, trg_vocab, device, max_len, batch_size, executor, cache,
+                                    beam_width, length_penalty, deadline)
@@ -0,0 +1,222 @@
+# Headless asyncio HTTP translation service with micro-batching of model-route requests:
+#   python server.py --port 8080 [--max-wait-ms 5 --max-batch 64 --deadline-ms 200]
+#   POST /translate {"text": "..."} or {"texts": ["...", ...]};  GET /health;  GET /stats;  GET /metrics
+import json, time, asyncio, argparse
+from concurrent.futures import ThreadPoolExecutor
+import torch
+
+from config import ARTIFACTS_DIR, DECODE_DEADLINE_S, INFERENCE_BACKEND
+from io_artifacts import load_artifacts
+from org_renderer import render_org_name_en
+from routing import is_likely_name, decode_batch, cache_key, fallback_translation
+from cache import TranslationCache
+import metrics
+
+class MicroBatcher:
+    # coalesces concurrent submissions into one decode call: up to max_batch items or max_wait seconds
+    def __init__(self, decode_fn, max_batch: int = 64, max_wait: float = 0.005):
+        self.decode_fn = decode_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = self.items = 0
+        self._queue = None
+        self._task = None
+        self._executor = ThreadPoolExecutor(max_workers=1)  # decode off the event loop, one batch at a time
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, text: str) -> str:
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, fut))
+        return await fut
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self.batches += 1; self.items += len(batch)
+            metrics.observe("batch_size", len(batch))
+            try:
+                outs = await loop.run_in_executor(self._executor, self.decode_fn, [t for t, _ in batch])
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            for (_, fut), out in zip(batch, outs):
+                if not fut.done():
+                    fut.set_result(out)
+
+class TranslationService:
+    def __init__(self, model, src_vocab, trg_vocab, device, max_len=50, beam_width=1, length_penalty=0.6,
+                 max_batch=64, max_wait=0.005, cache: TranslationCache = None, deadline: float = DECODE_DEADLINE_S):
+        self.model, self.src_vocab, self.trg_vocab, self.device = model, src_vocab, trg_vocab, device
+        self.max_len, self.beam_width, self.length_penalty = max_len, beam_width, length_penalty
+        self.deadline = deadline  # seconds of decode per batch, None = unbounded
+        self.cache = cache
+        self.batcher = MicroBatcher(self._decode, max_batch=max_batch, max_wait=max_wait)
+
+    def _decode(self, texts):
+        # -> [(translation, route)]; rows cut off by the deadline are answered by the fallback
+        deadline = None if self.deadline is None else time.monotonic() + self.deadline
+        outs, codes = decode_batch(self.model, texts, self.src_vocab, self.trg_vocab, self.device, max_len=self.max_len,
+                                   beam_width=self.beam_width, length_penalty=self.length_penalty, deadline=deadline,
+                                   return_status=True)
+        results = []
+        for text, out, code in zip(texts, outs, codes):
+            if code == "deadline":
+                metrics.inc("deadline_fallbacks_total")
+                results.append((fallback_translation(text), "fallback"))
+            else:
+                results.append((out, "model"))
+        return results
+
+    async def translate(self, text: str):
+        t0 = metrics.clock()
+        is_name = is_likely_name(text)
+        metrics.stage("route", t0)
+        metrics.inc("requests_total", (("route", "renderer" if is_name else "model"),))
+        key = None
+        if self.cache is not None:
+            key = cache_key(self.cache, self.model, text, is_name, self.max_len, self.beam_width, self.length_penalty)
+            out = self.cache.get(key)
+            metrics.inc("cache_misses_total" if out is None else "cache_hits_total")
+            if out is not None:
+                return out, "renderer" if is_name else "model"
+        if is_name:
+            out, route = render_org_name_en(text), "renderer"  # answered immediately, never queued
+        else:
+            out, route = await self.batcher.submit(text)
+        if key is not None and route != "fallback":
+            self.cache.put(key, out)
+        return out, route
+
+    async def handle(self, method: str, path: str, body: bytes):
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok"}
+        if method == "GET" and path == "/stats":
+            stats = {"batches": self.batcher.batches, "batched_items": self.batcher.items}
+            if self.cache is not None:
+                stats["cache"] = self.cache.stats()
+            if metrics.ENABLED:
+                stats["metrics"] = metrics.snapshot()
+            return 200, stats
+        if method == "GET" and path == "/metrics":
+            return 200, metrics.to_prometheus()  # text exposition format
+        if method == "POST" and path == "/translate":
+            try:
+                req = json.loads(body or b"{}")
+            except ValueError:
+                return 400, {"error": "body must be JSON"}
+            if isinstance(req.get("text"), str):
+                out, route = await self.translate(req["text"])
+                return 200, {"translation": out, "route": route}
+            texts = req.get("texts")
+            if isinstance(texts, list) and all(isinstance(t, str) for t in texts):
+                results = await asyncio.gather(*(self.translate(t) for t in texts))
+                return 200, {"translations": [r[0] for r in results], "routes": [r[1] for r in results]}
+            return 400, {"error": "expected {\"text\": str} or {\"texts\": [str, ...]}"}
+        return 404, {"error": f"no route for {method} {path}"}
+
+# --- Minimal HTTP/1.1 over asyncio streams (keep-alive, Content-Length bodies) ---
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large", 500: "Internal Server Error"}
+MAX_BODY = 16 * 1024 * 1024
+
+async def _serve_conn(service: TranslationService, reader, writer):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            try:
+                method, target, version = request_line.decode("latin-1").split()
+            except ValueError:
+                break
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length", 0) or 0)
+            if length > MAX_BODY:
+                status, payload = 413, {"error": "request body too large"}
+                body = b""
+            else:
+                body = await reader.readexactly(length) if length else b""
+                try:
+                    status, payload = await service.handle(method, target.split("?", 1)[0], body)
+                except Exception as e:
+                    status, payload = 500, {"error": str(e)}
+            if isinstance(payload, str):
+                data, ctype = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+            else:
+                data, ctype = json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8"
+            keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+            writer.write(f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                         f"Content-Type: {ctype}\r\n"
+                         f"Content-Length: {len(data)}\r\n"
+                         f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data)
+            await writer.drain()
+            if not keep_alive or status == 413:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def serve(service: TranslationService, host: str = "127.0.0.1", port: int = 8080):
+    service.batcher.start()
+    server = await asyncio.start_server(lambda r, w: _serve_conn(service, r, w), host, port)
+    print(f"Serving on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Async HTTP translation service with micro-batching.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--artifacts", default=ARTIFACTS_DIR)
+    ap.add_argument("--device", choices=["auto", "cpu", "cuda"], default="auto")
+    ap.add_argument("--mode", choices=["fp32", "int8"], default="fp32")
+    ap.add_argument("--script", action="store_true")
+    ap.add_argument("--shortlist", action="store_true", help="score only shortlisted target tokens (see shortlist.py)")
+    ap.add_argument("--backend", choices=["torch", "onnx"], default=INFERENCE_BACKEND, help="onnx = ONNX Runtime CPU (see onnx_backend.py)")
+    ap.add_argument("--max-batch", type=int, default=64)
+    ap.add_argument("--max-wait-ms", type=float, default=5.0)
+    ap.add_argument("--max-len", type=int, default=50)
+    ap.add_argument("--beam-width", type=int, default=1)
+    ap.add_argument("--length-penalty", type=float, default=0.6, help="GNMT length penalty for beam search")
+    ap.add_argument("--deadline-ms", type=float, default=None if DECODE_DEADLINE_S is None else DECODE_DEADLINE_S * 1000.0,
+                    help="decode budget per batch; rows still running get a rendered/transliterated fallback")
+    ap.add_argument("--no-cache", action="store_true")
+    ap.add_argument("--metrics", action="store_true", help="record per-stage latency histograms (GET /metrics)")
+    args = ap.parse_args(argv)
+    if args.metrics:
+        metrics.enable()
+
+    use_cuda = args.device == "cuda" or (args.device == "auto" and torch.cuda.is_available())
+    device = torch.device("cuda" if use_cuda else "cpu")
+    model, src_vocab, trg_vocab, _ = load_artifacts(args.artifacts, device, mode=args.mode, script=args.script,
+                                                  warm=True, shortlist=args.shortlist, backend=args.backend)
+    service = TranslationService(model, src_vocab, trg_vocab, device, max_len=args.max_len,
+                                 beam_width=args.beam_width, length_penalty=args.length_penalty, max_batch=args.max_batch,
+                                 max_wait=args.max_wait_ms / 1000.0,
+                                 cache=None if args.no_cache else TranslationCache(),
+                                 deadline=None if args.deadline_ms is None else args.deadline_ms / 1000.0)
+    asyncio.run(serve(service, args.host, args.port))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# Vocabulary shortlist for the decoder. Instead of projecting every step onto the whole target
+# vocabulary, score only the tokens likely for the batch (top translations of its source tokens under an
+# IBM Model 1 alignment of the training data, plus the most frequent target tokens). Build it next to
+# model.pt and report quality/speed against the full output layer:
+#   python shortlist.py [--artifacts artifacts_ar_en] [--eval-file manual_input.xlsx]
+# then load with load_artifacts(..., shortlist=True) (batch.py / server.py --shortlist).
+import os, sys, json, argparse
+import numpy as np
+import torch
+
+from config import SPECIALS, SHORTLIST_FILE, SHORTLIST_PER_SOURCE, SHORTLIST_FREQUENT, SHORTLIST_MIN_PROB
+
+class Shortlist:
+    # table: (S, K) target ids per source id, -1 padded; frequent: ids always scored (specials first, so
+    # in a sorted candidate set every special's position equals its id)
+    __slots__ = ("table", "frequent", "weight", "bias")
+
+    def __init__(self, table: torch.Tensor, frequent: torch.Tensor):
+        if not torch.equal(frequent[:len(SPECIALS)].cpu(), torch.arange(len(SPECIALS))):
+            raise ValueError("shortlist frequent ids must start with the special tokens")
+        self.table, self.frequent = table.long(), frequent.long()
+        self.weight = self.bias = None
+
+    def bind(self, fc) -> "Shortlist":
+        # keep the decoder's full output layer (dequantized for int8) so a scripted decoder can still be sliced
+        weight, bias = fc.weight, fc.bias
+        if callable(weight):  # dynamic quantized Linear
+            weight, bias = weight().dequantize(), bias()
+        self.weight, self.bias = weight.detach(), bias.detach()
+        self.table, self.frequent = self.table.to(self.weight.device), self.frequent.to(self.weight.device)
+        return self
+
+    def candidates(self, src: torch.Tensor) -> torch.Tensor:
+        # sorted target ids that may be produced for this (L, N) source batch
+        rows = self.table.index_select(0, src.unique())
+        return torch.cat([self.frequent, rows[rows >= 0]]).unique()
+
+    def projection(self, src: torch.Tensor):
+        # -> (candidate ids, their output weight rows, their biases) for one batch
+        cand = self.candidates(src)
+        return cand, self.weight.index_select(0, cand), self.bias.index_select(0, cand)
+
+def ibm1(pairs, src_size: int, trg_size: int, iterations: int = 5) -> np.ndarray:
+    # EM for IBM Model 1 translation probabilities -> (S, T) p(target | source); <sos> on the source side
+    # is the NULL word. pairs: [(src ids, trg ids)] as int arrays
+    prob = np.full((src_size, trg_size), 1.0 / trg_size, dtype=np.float32)
+    for it in range(iterations):
+        counts = np.zeros_like(prob)
+        for s, t in pairs:
+            post = prob[np.ix_(s, t)]
+            post /= post.sum(axis=0, keepdims=True)  # each target token spreads one count over the source
+            np.add.at(counts, (s[:, None], t[None, :]), post)
+        prob = counts / np.maximum(counts.sum(axis=1, keepdims=True), 1e-12)
+        print(f"IBM1 iteration {it + 1}/{iterations}", file=sys.stderr)
+    return prob
+
+def build_shortlist(pairs, src_size: int, trg_size: int, per_source: int = SHORTLIST_PER_SOURCE,
+                    frequent: int = SHORTLIST_FREQUENT, min_prob: float = SHORTLIST_MIN_PROB,
+                    iterations: int = 5) -> Shortlist:
+    # target vocab ids are sorted by corpus frequency after the specials, so the head is the frequent list
+    prob = torch.from_numpy(ibm1(pairs, src_size, trg_size, iterations))
+    top_p, top = prob.topk(min(per_source, trg_size), dim=1)
+    table = top.masked_fill(top_p < min_prob, -1).to(torch.int32)
+    return Shortlist(table, torch.arange(max(len(SPECIALS), min(frequent, trg_size))))
+
+def training_pairs(ds, limit: int = None):
+    # encoded training examples (dataset.PretokenizedDataset) -> [(src ids, trg ids without <sos>)]
+    n = len(ds) if limit is None else min(limit, len(ds))
+    return [(ds.src_ids[ds.src_off[i]:ds.src_off[i + 1]].astype(np.int64),
+             ds.trg_ids[ds.trg_off[i] + 1:ds.trg_off[i + 1]].astype(np.int64)) for i in range(n)]
+
+def save_shortlist(path: str, sl: Shortlist, src_vocab, trg_vocab):
+    # stamped with the vocabularies it indexes, so a shortlist outliving a vocab rebuild is refused
+    from dataset import vocab_digest
+    torch.save({"table": sl.table.to(torch.int32).cpu(), "frequent": sl.frequent.cpu(),
+                "src_vocab": vocab_digest(src_vocab), "trg_vocab": vocab_digest(trg_vocab)},
+               os.path.join(path, SHORTLIST_FILE))
+
+def load_shortlist(path: str, src_vocab, trg_vocab) -> Shortlist:
+    file = os.path.join(path, SHORTLIST_FILE)
+    if not os.path.exists(file):
+        raise FileNotFoundError(f"No shortlist at {file} (build it with: python shortlist.py --artifacts {path})")
+    from io_artifacts import load_state
+    from dataset import vocab_digest
+    state = load_state(file)
+    if (state.get("src_vocab"), state.get("trg_vocab")) != (vocab_digest(src_vocab), vocab_digest(trg_vocab)):
+        raise ValueError(f"{file} was built for different vocabularies; rebuild it")
+    return Shortlist(state["table"], state["frequent"])
+
+def main(argv=None):
+    from config import ARTIFACTS_DIR, DATA_CACHE_DIR
+    from tokenizers import tokenize_ar, tokenize_en
+    from dataset import pretokenize
+    from data_loading import load_ar_en_splits
+    from io_artifacts import load_artifacts
+    from model import encode_sources
+    from quantize import held_out_sentences, timed_decode, compare
+
+    ap = argparse.ArgumentParser(description="Build the decoder vocabulary shortlist and report quality vs speed.")
+    ap.add_argument("--artifacts", default=ARTIFACTS_DIR)
+    ap.add_argument("--per-source", type=int, default=SHORTLIST_PER_SOURCE, help="target candidates per source token")
+    ap.add_argument("--frequent", type=int, default=SHORTLIST_FREQUENT, help="most frequent target tokens always scored")
+    ap.add_argument("--min-prob", type=float, default=SHORTLIST_MIN_PROB)
+    ap.add_argument("--iterations", type=int, default=5, help="IBM Model 1 EM iterations")
+    ap.add_argument("--train-limit", type=int, default=None, help="align only the first N training pairs")
+    ap.add_argument("--eval-file", default=None, help="CSV/XLSX of held-out inputs (default: dataset test split)")
+    ap.add_argument("--column", default="Original_Arabic_Name")
+    ap.add_argument("--limit", type=int, default=500)
+    ap.add_argument("--batch-size", type=int, default=32)
+    args = ap.parse_args(argv)
+
+    device = torch.device("cpu")
+    full, src_vocab, trg_vocab, _ = load_artifacts(args.artifacts, device)
+    splits = load_ar_en_splits()
+    ds = pretokenize(splits["train"], tokenize_ar, tokenize_en, src_vocab, trg_vocab,
+                     cache_dir=os.path.join(DATA_CACHE_DIR, "train"))
+    sl = build_shortlist(training_pairs(ds, args.train_limit), len(src_vocab), len(trg_vocab), args.per_source,
+                         args.frequent, args.min_prob, args.iterations)
+    save_shortlist(args.artifacts, sl, src_vocab, trg_vocab)
+    fast, _, _, _ = load_artifacts(args.artifacts, device, shortlist=True)
+
+    sentences = held_out_sentences(args.eval_file, args.column, args.limit)
+    ref, t_full = timed_decode(full, sentences, src_vocab, trg_vocab, device, args.batch_size)
+    out, t_short = timed_decode(fast, sentences, src_vocab, trg_vocab, device, args.batch_size)
+    sizes = [len(fast.shortlist.candidates(encode_sources(sentences[i:i + args.batch_size], src_vocab, device)[0]))
+             for i in range(0, len(sentences), args.batch_size)]
+    n = max(1, len(sentences))
+    report = {
+        "sentences": len(sentences),
+        "batch_size": args.batch_size,
+        "target_vocab": len(trg_vocab),
+        "mean_candidates_per_batch": float(np.mean(sizes)) if sizes else 0.0,
+        "full_ms_per_sentence": 1000 * t_full / n,
+        "shortlist_ms_per_sentence": 1000 * t_short / n,
+        "speedup": t_full / max(1e-9, t_short),
+        **compare(ref, out),
+    }
+    with open(os.path.join(args.artifacts, "shortlist_report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+if __name__ == "__main__":
+    main()
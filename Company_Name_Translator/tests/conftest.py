@@ -0,0 +1,4 @@
+# the package modules import each other as top-level modules (from config import ...), so tests do too
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
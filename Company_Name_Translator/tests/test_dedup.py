@@ -0,0 +1,23 @@
+import pytest
+from dedup import NameClusterer, translate_clustered
+
+TEMPLATE = "شركة {} للتجارة والمقاولات العامة"
+DISTINCT = ["الهدى", "الهدف", "القصر", "القمر", "الشمري", "الشمس"]
+
+def test_shared_boilerplate_does_not_merge():
+    names = [TEMPLATE.format(x) for x in DISTINCT]
+    pairs = translate_clustered(None, names, None, None, "cpu", NameClusterer())
+    assert len({cid for _, cid in pairs}) == len(names)
+    assert len({en for en, _ in pairs}) == len(names)
+
+@pytest.mark.parametrize("seed", range(0, 200, 10))
+def test_candidates_are_checked_by_exact_jaccard(seed):
+    # exact Jaccard 0.684 < 0.8; the 32-permutation estimate alone crossed the threshold for some seeds
+    c = NameClusterer(seed=seed)
+    assert c.assign("شركة النيل للتجارة") != c.assign("شركة النور للتجارة")
+
+def test_variants_still_merge():
+    c = NameClusterer()
+    ids = {c.assign(t) for t in ["شركة الهدى للتجارة", "شركه الهدى للتجاره", "الهدى للتجارة ش.م.ع",
+                                 "شركة الهدى للتجارة والمقاولات"]}
+    assert len(ids) == 1
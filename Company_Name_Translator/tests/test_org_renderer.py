@@ -0,0 +1,27 @@
+import pytest
+from org_renderer import render_org_name_en
+
+# shipped manual_input.xlsx rows whose rendering once regressed
+CASES = [
+    ("شركة الدفع السريع لخدمات الدفع", "Al-Sarya Payment Services Company"),
+]
+
+@pytest.mark.parametrize("text,expected", CASES, ids=[c[0] for c in CASES])
+def test_render(text, expected):
+    assert render_org_name_en(text) == expected
+
+@pytest.fixture
+def glossary(tmp_path):
+    import glossary as gl
+    from org_renderer import load_glossary
+    tsv = tmp_path / "glossary.tsv"
+    tsv.write_text("مؤسسة\tEstablishment\torg\nسابك\tSABIC\tlexical\n", encoding="utf-8")
+    db = str(tmp_path / "glossary.db")
+    gl.compile_glossary([str(tsv)], db)
+    yield load_glossary(db)
+    load_glossary(None)
+
+def test_glossary_org_label_is_the_suffix(glossary):
+    assert render_org_name_en("مؤسسة سابك") == "SABIC Establishment"
+    # a built-in label still wins over a glossary one
+    assert render_org_name_en("مؤسسة سابك القابضة") == "SABIC Holding"
@@ -0,0 +1,96 @@
+# int8 and ONNX backends against the fp32 PyTorch model, on a small seeded random model built from the
+# shipped vocabularies (no trained weights needed)
+import os, warnings
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+from io_artifacts import (ModelConfig, load_vocabs, build_model, save_artifacts, load_artifacts, quantize_model,
+                          save_quantized, QUANTIZED_WEIGHTS)
+from model import batch_greedy_translate, beam_translate
+from quantize import compare
+from bench import sample_names, sample_sentences
+
+VOCABS = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "artifacts_ar_en")
+CPU = torch.device("cpu")
+SENTENCES = sample_names(64) + sample_sentences(64)
+
+@pytest.fixture(scope="module")
+def artifacts(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("artifacts"))
+    src_vocab, trg_vocab = load_vocabs(VOCABS)
+    cfg = ModelConfig(32, 32, 64, 2, 0.1, 0.1)
+    torch.manual_seed(0)
+    save_artifacts(path, build_model(cfg, len(src_vocab), len(trg_vocab)), src_vocab, trg_vocab, cfg)
+    return path
+
+def _greedy(model, src_vocab, trg_vocab):
+    return batch_greedy_translate(model, SENTENCES, src_vocab, trg_vocab, CPU)
+
+def test_int8_parity(artifacts):
+    fp32, src_vocab, trg_vocab, _ = load_artifacts(artifacts, CPU)
+    quantized = quantize_model(load_artifacts(artifacts, CPU)[0])
+    save_quantized(artifacts, quantized)
+    int8 = load_artifacts(artifacts, CPU, mode="int8")[0]
+    assert int8.fingerprint.count(":") == 3  # the saved int8 weights were used, not re-quantized
+    ref = _greedy(fp32, src_vocab, trg_vocab)
+    out = _greedy(int8, src_vocab, trg_vocab)
+    assert out == _greedy(quantized, src_vocab, trg_vocab)  # save/load round trip is exact
+    assert compare(ref, out)["token_agreement"] >= 0.8
+
+def test_stale_int8_weights_are_ignored(artifacts):
+    save_quantized(artifacts, quantize_model(load_artifacts(artifacts, CPU)[0]))
+    st = os.stat(os.path.join(artifacts, "model.pt"))
+    os.utime(os.path.join(artifacts, "model.pt"), ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+    with pytest.warns(UserWarning, match="does not match model.pt"):
+        int8 = load_artifacts(artifacts, CPU, mode="int8")[0]
+    assert int8.fingerprint.endswith(":int8")
+    os.remove(os.path.join(artifacts, QUANTIZED_WEIGHTS))
+
+def test_onnx_parity(artifacts):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    from onnx_backend import export_onnx, max_state_diff
+    model, src_vocab, trg_vocab, _ = load_artifacts(artifacts, CPU, backend="torch")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # exporter deprecation notices
+        export_onnx(model, artifacts)
+    onnx_model = load_artifacts(artifacts, CPU, backend="onnx")[0]
+    assert max_state_diff(model, onnx_model, src_vocab, SENTENCES) <= 1e-4
+    assert _greedy(onnx_model, src_vocab, trg_vocab) == _greedy(model, src_vocab, trg_vocab)
+    assert beam_translate(onnx_model, SENTENCES, src_vocab, trg_vocab, CPU, beam_width=4) == \
+        beam_translate(model, SENTENCES, src_vocab, trg_vocab, CPU, beam_width=4)
+
+def test_stale_onnx_graphs_are_refused(artifacts):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    from onnx_backend import export_onnx
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        export_onnx(load_artifacts(artifacts, CPU, backend="torch")[0], artifacts)
+    st = os.stat(os.path.join(artifacts, "model.pt"))
+    os.utime(os.path.join(artifacts, "model.pt"), ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+    with pytest.raises(ValueError, match="not exported from the current model.pt"):
+        load_artifacts(artifacts, CPU, backend="onnx")
+
+def test_stale_shortlist_is_refused(tmp_path):
+    from shortlist import build_shortlist, save_shortlist
+    from tokenizers import tokenize_ar, tokenize_en
+    from vocab import Vocab
+    from config import SPECIALS
+    path = str(tmp_path)
+    src_vocab, trg_vocab = load_vocabs(VOCABS)
+    cfg = ModelConfig(32, 32, 64, 2, 0.1, 0.1)
+    model = build_model(cfg, len(src_vocab), len(trg_vocab))
+    save_artifacts(path, model, src_vocab, trg_vocab, cfg)
+    pairs = [(np.asarray(src_vocab.lookup_indices(tokenize_ar(ar))),
+              np.asarray(trg_vocab.lookup_indices(tokenize_en(en)))) for ar, en in [("شركة النيل", "Al-Nil Company"), ("مكتب الخليج", "Al-Khalij Office")]]
+    save_shortlist(path, build_shortlist(pairs, len(src_vocab), len(trg_vocab), iterations=1), src_vocab, trg_vocab)
+    assert load_artifacts(path, CPU, shortlist=True)[0].shortlist is not None
+    # same size, different ids: the old shape check let this through
+    itos = list(trg_vocab.itos)
+    n = len(SPECIALS)
+    itos[n], itos[n + 1] = itos[n + 1], itos[n]
+    save_artifacts(path, model, src_vocab, Vocab.from_itos(itos), cfg)
+    with pytest.raises(ValueError, match="different vocabularies"):
+        load_artifacts(path, CPU, shortlist=True)
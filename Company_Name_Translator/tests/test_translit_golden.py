@@ -0,0 +1,18 @@
+import pytest
+from translit import transliterate_token
+from org_renderer import translit_simple
+from bench import GOLDEN_TRANSLIT
+
+def _golden_rows():
+    with open(GOLDEN_TRANSLIT, "r", encoding="utf-8") as f:
+        return [tuple(line.rstrip("\n").split("\t")) for line in f if not line.startswith("#")]
+
+GOLDEN = _golden_rows()
+
+def test_golden_file_is_populated():
+    assert len(GOLDEN) > 1000
+    assert all(len(row) == 3 for row in GOLDEN)
+
+@pytest.mark.parametrize("tok,scholarly,simple", GOLDEN, ids=[row[0] for row in GOLDEN])
+def test_translit_matches_golden(tok, scholarly, simple):
+    assert (transliterate_token(tok), translit_simple(tok)) == (scholarly, simple)
@@ -0,0 +1,17 @@
+import pytest
+from vocab import build_vocab, build_vocabs
+
+SPLIT = [{"translation": {"ar": "شركة النيل", "en": "Al-Nil Company"}},
+         {"translation": {"ar": "شركة القمر", "en": "Al-Qamar Company"}}]
+
+def tokenize(text): return text.split()
+
+def test_side_is_explicit():
+    src, trg = build_vocabs(SPLIT, tokenize, tokenize, min_freq=1)
+    # the same tokenizer for both sides: nothing to infer from its name
+    assert build_vocab(SPLIT, tokenize, min_freq=1, side="ar").itos == src.itos
+    assert build_vocab(SPLIT, tokenize, min_freq=1, side="en").itos == trg.itos
+    with pytest.raises(ValueError):
+        build_vocab(SPLIT, tokenize, side="fr")
+    with pytest.raises(TypeError):
+        build_vocab(SPLIT, tokenize)
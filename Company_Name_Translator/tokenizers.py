@@ -1,14 +1,34 @@
 from typing import List
 
-try:
-    import spacy
-    _spacy_en = spacy.load("en_core_web_sm")
-    def tokenize_en(text: str) -> List[str]:
-        return [t.text for t in _spacy_en.tokenizer(text)]
-except Exception:
-    _spacy_en = None
-    def tokenize_en(text: str) -> List[str]:
+# spaCy (and its model) is loaded on the first English tokenization, not at import: inference and
+# renderer-only processes never pay for it
+_spacy_en = None
+_spacy_tried = False
+
+def _spacy_tokenizer():
+    global _spacy_en, _spacy_tried
+    if not _spacy_tried:
+        _spacy_tried = True
+        try:
+            import spacy
+            _spacy_en = spacy.load("en_core_web_sm")
+        except Exception:
+            _spacy_en = None
+    return _spacy_en
+
+def tokenize_en(text: str) -> List[str]:
+    nlp = _spacy_tokenizer()
+    if nlp is None:
         return text.strip().split()
+    return [t.text for t in nlp.tokenizer(text)]
 
 def tokenize_ar(text: str) -> List[str]:
     return text.strip().split()
+
+def tokenizer_identity(fn) -> str:
+    # names what fn produces, for cache keys: tokenize_en depends on the spaCy model it found (if any)
+    ident = f"{getattr(fn, '__module__', None) or 'builtins'}.{fn.__qualname__}"  # str.split has no module
+    if fn is tokenize_en:
+        nlp = _spacy_tokenizer()
+        ident += f":{nlp.meta['lang']}_{nlp.meta['name']}-{nlp.meta['version']}" if nlp is not None else ":whitespace"
+    return ident
@@ -1,87 +1,315 @@
 import os
+import sys
+import json
+import argparse
+from contextlib import nullcontext
 import torch
 import pandas as pd
 import torch.nn as nn
 import torch.optim as optim
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel
 from torch.utils.data import DataLoader
 
 from config import (
-    ARTIFACTS_DIR, ENC_EMB, DEC_EMB, HID, LAYERS, DROPOUT, LR, BATCH, EPOCHS,
-    PAD_IDX
+    ARTIFACTS_DIR, ENC_EMB, DEC_EMB, HID, LAYERS, DROPOUT, LR, BATCH, EPOCHS, MAX_TOKENS,
+    DATA_CACHE_DIR, PARALLEL_DECODER, TEACHER_FORCE_RATIO, SCHEDULED_SAMPLING, USE_BF16, PAD_IDX,
+    GRAD_ACCUM_STEPS, CHECKPOINT_EVERY, CHECKPOINT_DIR,
+    STUDENT_ARTIFACTS_DIR, STUDENT_EMB, STUDENT_HID, STUDENT_LAYERS, STUDENT_DROPOUT
 )
 from tokenizers import tokenize_ar, tokenize_en
-from vocab import build_vocab
-from dataset import TranslationDataset, collate_fn
+from vocab import build_vocabs
+from dataset import collate_fn, pretokenize, split_digest, BucketBatchSampler
 from model import Encoder, Decoder, Seq2Seq
-from routing import translate_smart
+from routing import translate_smart, decode_batch, DECODE_LIMITS_KEY
 from data_loading import load_ar_en_splits
-from io_artifacts import ModelConfig, save_artifacts, load_artifacts
+from io_artifacts import ModelConfig, save_artifacts, load_artifacts, vocab_to_json, vocab_from_json, build_model
 
-def main():
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+def autocast_ctx(device, enabled: bool):
+    if not enabled:
+        return nullcontext()
+    if device.type == "cpu" and not torch.backends.mkldnn.is_available():
+        print("bfloat16 autocast needs oneDNN on CPU; training in fp32.")
+        return nullcontext()
+    return torch.autocast(device_type=device.type, dtype=torch.bfloat16)
 
-    if os.path.exists(os.path.join(ARTIFACTS_DIR, "model.pt")):
-        print(f"Loading saved model from {ARTIFACTS_DIR} …")
-        model, src_vocab, trg_vocab, cfg = load_artifacts(ARTIFACTS_DIR, device)
+def compute_loss(model, src, trg, criterion, parallel=PARALLEL_DECODER, teacher_force_ratio=None):
+    if parallel:
+        ratio = 1.0 - SCHEDULED_SAMPLING if teacher_force_ratio is None else teacher_force_ratio
+        logits = model(src, trg, teacher_force_ratio=ratio, parallel=True)  # (T-1, N, V), no zeros row
+    else:
+        ratio = TEACHER_FORCE_RATIO if teacher_force_ratio is None else teacher_force_ratio
+        logits = model(src, trg, teacher_force_ratio=ratio)[1:]
+    return criterion(logits.reshape(-1, logits.shape[-1]).float(), trg[1:].reshape(-1))
+
+def train_epoch(model, loader, optimizer, criterion, device, use_bf16=USE_BF16, accum_steps=1,
+                start_batch=0, on_step=None):
+    # accum_steps micro-batches per optimizer step; DDP only all-reduces on the last one of each group.
+    # on_step(batch_in_epoch) runs after every optimizer step (used for checkpoints).
+    model.train()
+    total = torch.zeros((), device=device)  # accumulated on-device; read once per epoch
+    count, n_batches = 0, len(loader)
+    optimizer.zero_grad()
+    for i, (src, trg) in enumerate(loader):
+        src, trg = src.to(device), trg.to(device)
+        boundary = (i + 1) % accum_steps == 0 or i + 1 == n_batches
+        sync = nullcontext() if boundary or not hasattr(model, "no_sync") else model.no_sync()
+        with sync:
+            with autocast_ctx(device, use_bf16):
+                loss = compute_loss(model, src, trg, criterion)
+            (loss / accum_steps).backward()
+        total += loss.detach()
+        count += 1
+        if boundary:
+            nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+            optimizer.step()
+            optimizer.zero_grad()
+            if on_step is not None:
+                on_step(start_batch + i + 1)
+    return total.item() / max(1, count)
+
+def evaluate(model, loader, criterion, device, use_bf16=USE_BF16):
+    model.eval()
+    total = torch.zeros((), device=device)
+    count = 0
+    with torch.no_grad(), autocast_ctx(device, use_bf16):
+        for src, trg in loader:
+            src, trg = src.to(device), trg.to(device)
+            total += compute_loss(model, src, trg, criterion,
+                                  teacher_force_ratio=1.0 if PARALLEL_DECODER else None)
+            count += 1
+    return total.item() / max(1, count)
+
+# --- Distributed (DDP over gloo, works on CPU-only boxes) + resumable checkpoints ---
+def setup_distributed():
+    # launched with torchrun: RANK / WORLD_SIZE / LOCAL_RANK come from the environment
+    if int(os.environ.get("WORLD_SIZE", "1")) > 1:
+        dist.init_process_group(backend="gloo")
+        return dist.get_rank(), dist.get_world_size()
+    return 0, 1
+
+def barrier():
+    if dist.is_available() and dist.is_initialized():
+        dist.barrier()
+
+def broadcast(obj):
+    # rank 0's value on every rank: files only rank 0 writes (checkpoints, artifacts) may not exist on
+    # other nodes, so only rank 0 looks at them
+    if dist.is_available() and dist.is_initialized():
+        box = [obj]
+        dist.broadcast_object_list(box, src=0)
+        return box[0]
+    return obj
+
+def unwrap(model): return model.module if isinstance(model, DistributedDataParallel) else model
+
+def checkpoint_path() -> str: return os.path.join(CHECKPOINT_DIR, "last.pt")
+
+def save_checkpoint(model, optimizer, src_vocab, trg_vocab, cfg, epoch, batch_in_epoch, step):
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    state = {
+        "model": unwrap(model).state_dict(), "optimizer": optimizer.state_dict(),
+        "src_vocab": vocab_to_json(src_vocab), "trg_vocab": vocab_to_json(trg_vocab), "cfg": cfg.__dict__,
+        "epoch": epoch, "batch_in_epoch": batch_in_epoch, "step": step,
+    }
+    tmp = checkpoint_path() + ".tmp"
+    torch.save(state, tmp)
+    os.replace(tmp, checkpoint_path())  # a preempted write never corrupts the last good checkpoint
+
+def train_model(device, rank=0, world_size=1, epochs=EPOCHS, accum_steps=GRAD_ACCUM_STEPS,
+                checkpoint_every=CHECKPOINT_EVERY, resume=True):
+    is_main = rank == 0
+    splits = load_ar_en_splits()
+    ckpt = None
+    if is_main and resume and os.path.exists(checkpoint_path()):
+        ckpt = torch.load(checkpoint_path(), map_location="cpu")
+        print(f"Resuming from {checkpoint_path()} (epoch {ckpt['epoch']+1}, batch {ckpt['batch_in_epoch']}) …")
+    ckpt = broadcast(ckpt)
+    if ckpt:
+        src_vocab, trg_vocab = vocab_from_json(ckpt["src_vocab"]), vocab_from_json(ckpt["trg_vocab"])
     else:
-        print("No saved model found. Training once (online if HF is available)…")
-        splits = load_ar_en_splits()
-        print("Building vocabularies …")
-        src_vocab = build_vocab(splits["train"], tokenize_ar, max_size=2048, min_freq=1)
-        trg_vocab = build_vocab(splits["train"], tokenize_en, max_size=2048, min_freq=1)
+        if is_main:
+            print("Building vocabularies …")
+        src_vocab, trg_vocab = build_vocabs(splits["train"], tokenize_ar, tokenize_en, max_size=2048, min_freq=1)
+    if is_main:
         print(f"Vocab sizes — AR: {len(src_vocab)}  EN: {len(trg_vocab)}")
 
-        train_ds = TranslationDataset(splits["train"], tokenize_ar, tokenize_en, src_vocab, trg_vocab)
-        valid_ds = TranslationDataset(splits["validation"], tokenize_ar, tokenize_en, src_vocab, trg_vocab)
-        train_loader = DataLoader(train_ds, batch_size=BATCH, shuffle=True, collate_fn=collate_fn)
-        valid_loader = DataLoader(valid_ds, batch_size=BATCH, shuffle=False, collate_fn=collate_fn)
-
-        cfg = ModelConfig(
-            encoder_embedding_size=ENC_EMB,
-            decoder_embedding_size=DEC_EMB,
-            hidden_size=HID,
-            num_layers=LAYERS,
-            enc_dropout=DROPOUT,
-            dec_dropout=DROPOUT,
-        )
-
-        encoder = Encoder(len(src_vocab), cfg.encoder_embedding_size, cfg.hidden_size, cfg.num_layers, cfg.enc_dropout).to(device)
-        decoder = Decoder(len(trg_vocab), cfg.decoder_embedding_size, cfg.hidden_size, len(trg_vocab), cfg.num_layers, cfg.dec_dropout).to(device)
-        model = Seq2Seq(encoder, decoder, trg_vocab_size=len(trg_vocab)).to(device)
-
-        optimizer = optim.Adam(model.parameters(), lr=LR)
-        criterion = nn.CrossEntropyLoss(ignore_index=PAD_IDX)
-
-        for epoch in range(EPOCHS):
-            model.train()
-            total = 0.0
-            for src, trg in train_loader:
-                src, trg = src.to(device), trg.to(device)
-                outputs = model(src, trg)
-                logits = outputs[1:].reshape(-1, outputs.shape[2])
-                gold   = trg[1:].reshape(-1)
-                optimizer.zero_grad()
-                loss = criterion(logits, gold)
-                loss.backward()
-                nn.utils.clip_grad_norm_(model.parameters(), 1.0)
-                optimizer.step()
-                total += loss.item()
-
-            # validation
-            model.eval()
-            with torch.no_grad():
-                val_loss, count = 0.0, 0
-                for src, trg in valid_loader:
-                    src, trg = src.to(device), trg.to(device)
-                    outputs = model(src, trg)
-                    logits = outputs[1:].reshape(-1, outputs.shape[2])
-                    gold   = trg[1:].reshape(-1)
-                    val_loss += criterion(logits, gold).item()
-                    count += 1
-            print(f"Epoch {epoch+1} | Val Loss: {val_loss / max(1, count):.4f}")
-
-        print(f"Saving artifacts to {ARTIFACTS_DIR} …")
-        save_artifacts(ARTIFACTS_DIR, model, src_vocab, trg_vocab, cfg)
+    # encode each split once (cached on disk; local rank 0 of every node writes, the others reuse it),
+    # then bucket by length. Cache files are replaced atomically, so nodes sharing a filesystem are safe
+    def encode(name):
+        return pretokenize(splits[name], tokenize_ar, tokenize_en, src_vocab, trg_vocab,
+                           cache_dir=os.path.join(DATA_CACHE_DIR, name))
+    local_main = int(os.environ.get("LOCAL_RANK", rank)) == 0
+    if local_main:
+        train_ds, valid_ds = encode("train"), encode("validation")
+    barrier()
+    if not local_main:
+        train_ds, valid_ds = encode("train"), encode("validation")
+    train_sampler = BucketBatchSampler(train_ds.lengths, BATCH, max_tokens=MAX_TOKENS, shuffle=True,
+                                       num_replicas=world_size, rank=rank)
+    valid_sampler = BucketBatchSampler(valid_ds.lengths, BATCH, max_tokens=MAX_TOKENS, shuffle=False)
+    train_loader = DataLoader(train_ds, batch_sampler=train_sampler, collate_fn=collate_fn)
+    valid_loader = DataLoader(valid_ds, batch_sampler=valid_sampler, collate_fn=collate_fn)
+
+    cfg = ModelConfig(**ckpt["cfg"]) if ckpt else ModelConfig(
+        encoder_embedding_size=ENC_EMB,
+        decoder_embedding_size=DEC_EMB,
+        hidden_size=HID,
+        num_layers=LAYERS,
+        enc_dropout=DROPOUT,
+        dec_dropout=DROPOUT,
+    )
+
+    encoder = Encoder(len(src_vocab), cfg.encoder_embedding_size, cfg.hidden_size, cfg.num_layers, cfg.enc_dropout).to(device)
+    decoder = Decoder(len(trg_vocab), cfg.decoder_embedding_size, cfg.hidden_size, len(trg_vocab), cfg.num_layers, cfg.dec_dropout).to(device)
+    model = Seq2Seq(encoder, decoder, trg_vocab_size=len(trg_vocab)).to(device)
+    optimizer = optim.Adam(model.parameters(), lr=LR)
+    start_epoch, start_batch, step = 0, 0, 0
+    if ckpt:
+        model.load_state_dict(ckpt["model"])
+        optimizer.load_state_dict(ckpt["optimizer"])
+        start_epoch, start_batch, step = ckpt["epoch"], ckpt["batch_in_epoch"], ckpt["step"]
+    if world_size > 1:
+        model = DistributedDataParallel(model, device_ids=[device.index] if device.type == "cuda" else None)
+    criterion = nn.CrossEntropyLoss(ignore_index=PAD_IDX)
+
+    for epoch in range(start_epoch, epochs):
+        train_sampler.set_epoch(epoch, start=start_batch if epoch == start_epoch else 0)
+        def on_step(batch_in_epoch, epoch=epoch):
+            nonlocal step
+            step += 1
+            if is_main and checkpoint_every and step % checkpoint_every == 0:
+                save_checkpoint(model, optimizer, src_vocab, trg_vocab, cfg, epoch, batch_in_epoch, step)
+        train_loss = train_epoch(model, train_loader, optimizer, criterion, device, accum_steps=accum_steps,
+                                 start_batch=train_sampler.start, on_step=on_step)
+        if is_main:
+            save_checkpoint(model, optimizer, src_vocab, trg_vocab, cfg, epoch + 1, 0, step)
+            val_loss = evaluate(unwrap(model), valid_loader, criterion, device)
+            print(f"Epoch {epoch+1} | Train Loss: {train_loss:.4f} | Val Loss: {val_loss:.4f}")
+        barrier()
+    return unwrap(model), src_vocab, trg_vocab, cfg
+
+# --- Sequence-level knowledge distillation: a small student learns the teacher's own translations ---
+def distill_split(teacher, split, src_vocab, trg_vocab, device, batch_size=128, beam_width=1):
+    # the teacher's output replaces every reference translation (decoded in length-sorted batches)
+    texts = [rec["translation"]["ar"] for rec in split]
+    order = sorted(range(len(texts)), key=lambda i: len(tokenize_ar(texts[i])))
+    outs = [None] * len(texts)
+    for start in range(0, len(order), batch_size):
+        idx = order[start:start + batch_size]
+        for i, out in zip(idx, decode_batch(teacher, [texts[i] for i in idx], src_vocab, trg_vocab, device,
+                                            beam_width=beam_width)):
+            outs[i] = out
+        if (start // batch_size) % 100 == 0:
+            print(f"Teacher decoding {start + len(idx)}/{len(texts)} …")
+    return [{"translation": {"ar": ar, "en": en}} for ar, en in zip(texts, outs)]
+
+def distill_model(teacher_dir, device, student_cfg: ModelConfig, epochs=EPOCHS, beam_width=1):
+    teacher, src_vocab, trg_vocab, _ = load_artifacts(teacher_dir, device, warm=True)
+    splits = load_ar_en_splits()
+    # teacher outputs are joined vocab tokens, so str.split re-encodes them exactly. The cache is keyed
+    # (through pretokenize's meta check) on what the outputs derive from: the teacher model as loaded,
+    # its decode settings and the source split; the teacher only decodes on a miss
+    source = {"teacher": teacher.fingerprint, "beam": beam_width, "decode_limits": DECODE_LIMITS_KEY,
+              "train": split_digest(splits["train"])}
+    cache_dir = os.path.join(DATA_CACHE_DIR, f"distill_{teacher.fingerprint.split(':')[0]}_beam{beam_width}")
+    train_ds = pretokenize(lambda: distill_split(teacher, splits["train"], src_vocab, trg_vocab, device,
+                                                 beam_width=beam_width),
+                           tokenize_ar, str.split, src_vocab, trg_vocab, cache_dir=cache_dir, source=source)
+    # validation keeps the human references: the student is judged on the task, not on imitation
+    valid_ds = pretokenize(splits["validation"], tokenize_ar, tokenize_en, src_vocab, trg_vocab,
+                           cache_dir=os.path.join(DATA_CACHE_DIR, "validation"))
+    train_sampler = BucketBatchSampler(train_ds.lengths, BATCH, max_tokens=MAX_TOKENS, shuffle=True)
+    valid_sampler = BucketBatchSampler(valid_ds.lengths, BATCH, max_tokens=MAX_TOKENS, shuffle=False)
+    train_loader = DataLoader(train_ds, batch_sampler=train_sampler, collate_fn=collate_fn)
+    valid_loader = DataLoader(valid_ds, batch_sampler=valid_sampler, collate_fn=collate_fn)
+
+    student = build_model(student_cfg, len(src_vocab), len(trg_vocab)).to(device)
+    optimizer = optim.Adam(student.parameters(), lr=LR)
+    criterion = nn.CrossEntropyLoss(ignore_index=PAD_IDX)
+    for epoch in range(epochs):
+        train_sampler.set_epoch(epoch)
+        train_loss = train_epoch(student, train_loader, optimizer, criterion, device)
+        val_loss = evaluate(student, valid_loader, criterion, device)
+        print(f"Student epoch {epoch+1} | Train Loss (vs teacher): {train_loss:.4f} | Val Loss: {val_loss:.4f}")
+    return teacher, student.eval(), src_vocab, trg_vocab
+
+def distill_report(teacher, student, src_vocab, trg_vocab, device, eval_file=None, limit=500, batch_size=32) -> dict:
+    from quantize import held_out_sentences, timed_decode, compare
+    sentences = held_out_sentences(eval_file, limit=limit)
+    ref, t_teacher = timed_decode(teacher, sentences, src_vocab, trg_vocab, device, batch_size)
+    out, t_student = timed_decode(student, sentences, src_vocab, trg_vocab, device, batch_size)
+    n = max(1, len(sentences))
+    return {
+        "sentences": len(sentences),
+        "batch_size": batch_size,
+        "teacher_params": sum(p.numel() for p in teacher.parameters()),
+        "student_params": sum(p.numel() for p in student.parameters()),
+        "teacher_ms_per_sentence": 1000 * t_teacher / n,
+        "student_ms_per_sentence": 1000 * t_student / n,
+        "speedup": t_teacher / max(1e-9, t_student),
+        **compare(ref, out),  # agreement with the teacher
+    }
+
+def run_distill(args, device):
+    cfg = ModelConfig(encoder_embedding_size=args.student_emb, decoder_embedding_size=args.student_emb,
+                      hidden_size=args.student_hidden, num_layers=args.student_layers,
+                      enc_dropout=args.student_dropout, dec_dropout=args.student_dropout)
+    teacher, student, src_vocab, trg_vocab = distill_model(args.distill, device, cfg, epochs=args.epochs,
+                                                           beam_width=args.distill_beam)
+    print(f"Saving student to {args.student_out} …")
+    save_artifacts(args.student_out, student, src_vocab, trg_vocab, cfg)
+    student, _, _, _ = load_artifacts(args.student_out, device, warm=True)  # round-trips the saved files
+    report = distill_report(teacher, student, src_vocab, trg_vocab, device, args.eval_file)
+    report.update(teacher=os.path.abspath(args.distill), teacher_beam=args.distill_beam, student_cfg=cfg.__dict__)
+    with open(os.path.join(args.student_out, "distill_report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Train (or load) the AR→EN model, then run a demo.")
+    ap.add_argument("--epochs", type=int, default=EPOCHS)
+    ap.add_argument("--accum-steps", type=int, default=GRAD_ACCUM_STEPS)
+    ap.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY, help="optimizer steps (0 = per epoch only)")
+    ap.add_argument("--no-resume", action="store_true", help="ignore an existing checkpoint")
+    ap.add_argument("--distill", metavar="TEACHER_DIR", default=None,
+                    help="train a small student on this teacher's translations instead (single process)")
+    ap.add_argument("--student-out", default=STUDENT_ARTIFACTS_DIR)
+    ap.add_argument("--student-emb", type=int, default=STUDENT_EMB)
+    ap.add_argument("--student-hidden", type=int, default=STUDENT_HID)
+    ap.add_argument("--student-layers", type=int, default=STUDENT_LAYERS)
+    ap.add_argument("--student-dropout", type=float, default=STUDENT_DROPOUT)
+    ap.add_argument("--distill-beam", type=int, default=1, help="teacher beam width for the distilled targets")
+    ap.add_argument("--eval-file", default=None, help="CSV/XLSX of held-out inputs for the report (default: test split)")
+    args = ap.parse_args(argv)
+    if args.distill:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        return run_distill(args, device)
+
+    rank, world_size = setup_distributed()
+    if torch.cuda.is_available():
+        device = torch.device("cuda", int(os.environ.get("LOCAL_RANK", 0)) % torch.cuda.device_count())
+    else:
+        device = torch.device("cpu")
+
+    if broadcast(rank == 0 and os.path.exists(os.path.join(ARTIFACTS_DIR, "model.pt"))):
+        print(f"Loading saved model from {ARTIFACTS_DIR} …")
+        model, src_vocab, trg_vocab, cfg = load_artifacts(ARTIFACTS_DIR, device)
+    else:
+        if rank == 0:
+            print("No saved model found. Training once (online if HF is available)…")
+        model, src_vocab, trg_vocab, cfg = train_model(device, rank, world_size, epochs=args.epochs,
+                                                       accum_steps=args.accum_steps,
+                                                       checkpoint_every=args.checkpoint_every,
+                                                       resume=not args.no_resume)
+        if rank == 0:
+            print(f"Saving artifacts to {ARTIFACTS_DIR} …")
+            save_artifacts(ARTIFACTS_DIR, model, src_vocab, trg_vocab, cfg)
+        if world_size > 1:
+            dist.destroy_process_group()
+    if rank != 0:
+        return
 
     # Offline inference demo
     examples = [
@@ -1,4 +1,6 @@
 import re
+from functools import lru_cache
+from config import TRANSLIT_MEMO_SIZE
 
 SUN_LETTERS = set("تثدذرزسشصضطظلن")
 AR_DIACRITICS = ''.join([
@@ -8,11 +10,15 @@ AR_DIACRITICS = ''.join([
 ])
 TATWEEL = '\u0640'
 
+# One translate() pass: alef/ya folding, tatweel + diacritic deletion
+_DIACRITICS_TABLE = str.maketrans(dict.fromkeys(AR_DIACRITICS))
+_NORMALIZE_TABLE = str.maketrans({'أ':'ا', 'إ':'ا', 'آ':'ا', 'ى':'ي', TATWEEL: None, **dict.fromkeys(AR_DIACRITICS)})
+
+def strip_diacritics(s: str) -> str: return s.translate(_DIACRITICS_TABLE)
+
 def ar_normalize(s: str) -> str:
-    s = s.replace('أ','ا').replace('إ','ا').replace('آ','ا')
-    s = s.replace('ى','ي').replace(TATWEEL, '')
-    s = re.sub(f"[{AR_DIACRITICS}]", "", s)
-    return re.sub(r"\s+", " ", s).strip()
+    # split()/join collapses and strips the same Unicode whitespace as re's \s+
+    return " ".join(s.translate(_NORMALIZE_TABLE).split())
 
 BASE = {
     'ا':'a','ب':'b','ت':'t','ث':'th','ج':'j','ح':'h','خ':'kh','د':'d','ذ':'dh','ر':'r','ز':'z',
@@ -20,35 +26,56 @@ BASE = {
     'ل':'l','م':'m','ن':'n','ه':'h','و':'w','ي':'y','ء':"'", 'ؤ':"'", 'ئ':"'", 'ة':'t',
 }
 
-def transliterate_token(tok: str,
-                        assimilate_al: bool = True,
-                        final_ta_marbuta_a: bool = True,
-                        double_for_shadda: bool = True) -> str:
+# --- Transliteration engine: str.translate tables + precompiled patterns, memoized per token ---
+# (name tokens repeat heavily, so most calls are a single cache hit)
+_BASE_TABLE = str.maketrans(BASE)
+_SHADDA_RE = re.compile(r'([ءاأإآبتثجحخدذرزسشصضطظعغفقكلمنهوىي])\u0651')
+_GLOTTAL_RE = re.compile(r"\'(?=[aeiou])")
+_DASHES_RE = re.compile(r"\-+")
+_SIMPLE_VOWEL_RE = re.compile(r"\b(q|k|m|b|f|s|d|t|r|n|l)([bcdfghjklmnpqrstvwxyz])")
+# "al-" before a sun letter assimilates to a + the letter's first latin char: الشمس -> ash-
+_SUN_PREFIX = {c: "a" + BASE.get(c, c)[0] + "-" for c in SUN_LETTERS}
+
+@lru_cache(maxsize=TRANSLIT_MEMO_SIZE)
+def _scholarly(tok: str, assimilate_al: bool, final_ta_marbuta_a: bool, double_for_shadda: bool) -> str:
     if not tok: return tok
-    out = ""
     if double_for_shadda and '\u0651' in tok:
-        tok = re.sub(r'([ءاأإآبتثجحخدذرزسشصضطظعغفقكلمنهوىي]\u0651)',
-                     lambda m: m.group(0)[0]*2, tok).replace('\u0651','')
-    end_as_a = False
-    if final_ta_marbuta_a and tok.endswith('ة'):
+        tok = _SHADDA_RE.sub(r"\1\1", tok).replace('\u0651', '')
+    end_as_a = final_ta_marbuta_a and tok.endswith('ة')
+    if end_as_a:
         tok = tok[:-1] + 'ه'
-        end_as_a = True
-    if tok.startswith('ال') and len(tok) >= 2:
-        nxt = tok[2:3]
-        if assimilate_al and nxt and nxt in SUN_LETTERS:
-            cons = transliterate_token(nxt, assimilate_al=False, final_ta_marbuta_a=False, double_for_shadda=False)
-            out = "a" + cons[0] + "-"
-            tok = tok[2:]
-        else:
-            out = "al-"; tok = tok[2:]
-    for ch in tok:
-        out += BASE.get(ch, ch)
-    if end_as_a and (out.endswith('h') or out.endswith('t')):
+    prefix = ""
+    if tok.startswith('ال'):
+        prefix = (assimilate_al and _SUN_PREFIX.get(tok[2:3])) or "al-"
+        tok = tok[2:]
+    out = prefix + tok.translate(_BASE_TABLE)
+    if end_as_a and out[-1:] in ('h', 't'):
         out = out[:-1] + 'a'
-    out = re.sub(r"\'(?=[aeiou])", "", out)
-    out = re.sub(r"\-+", "-", out).strip('-')
+    if "'" in out:
+        out = _GLOTTAL_RE.sub("", out)
+    if "-" in out:
+        out = _DASHES_RE.sub("-", out).strip('-')
     return out
 
+def transliterate_token(tok: str,
+                        assimilate_al: bool = True,
+                        final_ta_marbuta_a: bool = True,
+                        double_for_shadda: bool = True) -> str:
+    return _scholarly(tok, assimilate_al, final_ta_marbuta_a, double_for_shadda)
+
+@lru_cache(maxsize=TRANSLIT_MEMO_SIZE)
+def transliterate_simple(tok: str) -> str:
+    # renderer style: "Al-" + capitalized body, an "a" after a leading consonant cluster
+    al = tok.startswith('ال')
+    out = (tok[2:] if al else tok).translate(_BASE_TABLE)
+    out = _SIMPLE_VOWEL_RE.sub(r"\1a\2", out)
+    if "'" in out:
+        out = _GLOTTAL_RE.sub("", out)
+    out = out.replace("--", "-").strip("-").capitalize()
+    return "Al-" + out if al else out
+
+def clear_translit_memo():
+    _scholarly.cache_clear(); transliterate_simple.cache_clear()
+
 def transliterate_arabic_name(s: str) -> str:
-    s = ar_normalize(s)
-    return " ".join(transliterate_token(p) for p in s.split())
+    return " ".join([_scholarly(p, True, True, True) for p in ar_normalize(s).split()])
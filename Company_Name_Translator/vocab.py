@@ -1,26 +1,82 @@
+import sys
 from collections import Counter
-from typing import List
+from typing import List, Sequence
 from config import SPECIALS, PAD_IDX, SOS_IDX, EOS_IDX, UNK_IDX
 
 class Vocab:
+    # itos is an immutable table of interned strings (tokens seen at encode time compare by identity
+    # in the dict); _shown is the same table with the specials blanked out, used by decode_batch
+    __slots__ = ("itos", "stoi", "_shown")
+
     def __init__(self, counter: Counter, max_size: int = 10000, min_freq: int = 2):
         tokens_freq = [(tok, freq) for tok, freq in counter.items() if freq >= min_freq]
         tokens_freq.sort(key=lambda x: (-x[1], x[0]))
         tokens = [tok for tok, _ in tokens_freq]
         if max_size is not None:
             tokens = tokens[: max(0, max_size - len(SPECIALS))]
-        self.itos = list(SPECIALS) + tokens
-        self.stoi = {tok: i for i, tok in enumerate(self.itos)}
+        self._set_itos(list(SPECIALS) + tokens)
+
+    @classmethod
+    def from_itos(cls, itos: Sequence[str]) -> "Vocab":
+        v = cls.__new__(cls)
+        v._set_itos(itos)
+        return v
+
+    def _set_itos(self, itos):
+        self.itos = tuple(map(sys.intern, itos))
+        self.stoi = dict(zip(self.itos, range(len(self.itos))))
+        self._shown = tuple("" if i in (PAD_IDX, SOS_IDX, EOS_IDX) else t for i, t in enumerate(self.itos))
+
     def __len__(self): return len(self.itos)
     def lookup_indices(self, tokens: List[str]) -> List[int]:
         return [self.stoi.get(t, UNK_IDX) for t in tokens]
     def lookup_tokens(self, ids: List[int]) -> List[str]:
         return [self.itos[i] if 0 <= i < len(self.itos) else "<unk>" for i in ids]
 
-def build_vocab(split, tokenizer, max_size=2048, min_freq=2) -> "Vocab":
-    counter = Counter()
+    def encode_batch(self, token_lists: Sequence[Sequence[str]], add_sos_eos: bool = True):
+        # -> (padded (L, N) LongTensor, lengths (N,)); one flat id list scattered into a PAD-filled grid
+        import torch  # only here: building or looking up a vocab does not need torch
+        get, extra = self.stoi.get, 2 if add_sos_eos else 0
+        flat, lengths = [], []
+        for toks in token_lists:
+            if add_sos_eos:
+                flat.append(SOS_IDX)
+            flat.extend(get(t, UNK_IDX) for t in toks)
+            if add_sos_eos:
+                flat.append(EOS_IDX)
+            lengths.append(len(toks) + extra)
+        lengths = torch.tensor(lengths, dtype=torch.long)
+        out = torch.full((len(lengths), int(lengths.max()) if len(lengths) else 0), PAD_IDX, dtype=torch.long)
+        out[torch.arange(out.shape[1]) < lengths.unsqueeze(1)] = torch.tensor(flat, dtype=torch.long)
+        return out.t().contiguous(), lengths
+
+    def decode_batch(self, ids: "torch.Tensor") -> List[str]:
+        # ids: (N, T) batch-first. Everything from the first EOS on becomes PAD on the device, then a
+        # single host copy; specials map to "" in _shown and drop out in the join filter
+        ids = ids.masked_fill((ids == EOS_IDX).cumsum(dim=1) > 0, PAD_IDX)
+        ids = ids.masked_fill((ids < 0) | (ids >= len(self.itos)), UNK_IDX)
+        shown = self._shown.__getitem__
+        return [" ".join(filter(None, map(shown, row))) for row in ids.tolist()]
+
+SIDES = ("ar", "en")
+
+def _count(split, tokenizers: dict) -> dict:
+    # one pass over the split; tokenizers maps a side ("ar"/"en") to its tokenizer -> {side: Counter}
+    counters = {side: Counter() for side in tokenizers}
     for rec in split:
-        # identify direction by function object
-        text = rec["translation"]["ar"] if tokenizer.__name__ == "tokenize_ar" else rec["translation"]["en"]
-        counter.update(tokenizer(text))
-    return Vocab(counter, max_size=max_size, min_freq=min_freq)
+        pair = rec["translation"]
+        for side, tokenizer in tokenizers.items():
+            counters[side].update(tokenizer(pair[side]))
+    return counters
+
+def build_vocab(split, tokenizer, max_size=2048, min_freq=2, *, side: str) -> Vocab:
+    # one side of the split; build_vocabs does both in one pass
+    if side not in SIDES:
+        raise ValueError(f"side must be one of {SIDES}, got {side!r}")
+    return Vocab(_count(split, {side: tokenizer})[side], max_size=max_size, min_freq=min_freq)
+
+def build_vocabs(split, src_tokenizer, trg_tokenizer, max_size=2048, min_freq=2):
+    # -> (src_vocab, trg_vocab)
+    counters = _count(split, {"ar": src_tokenizer, "en": trg_tokenizer})
+    return (Vocab(counters["ar"], max_size=max_size, min_freq=min_freq),
+            Vocab(counters["en"], max_size=max_size, min_freq=min_freq))